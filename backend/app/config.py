@@ -20,11 +20,77 @@ class Settings(BaseSettings):
     MIN_INTERACTIONS_FOR_COLLABORATIVE: int = 3
     RECOMMENDATION_COUNT: int = 10
     SERENDIPITY_FACTOR: float = 0.05  # 5% wild cards
+    POPULARITY_HALF_LIFE_DAYS: float = 7.0  # cold-start popularity decay
+    POPULARITY_FLUSH_EVERY: int = 50  # persist popularity counters after this many dirty products
+    ITEM_KNN_NEIGHBOURS: int = 50  # top-K similar items kept per product
+    CONTENT_SIMILAR_NEIGHBOURS: int = 20  # top-K "more like this" products kept per product
+    MATRIX_COMPACT_EVERY: int = 1000  # fold pending interaction-matrix writes once this many cells changed
+    MATRIX_COMPACT_SECONDS: float = 2.0  # ... or once the oldest pending write is this old
+    
+    # approximate nearest neighbours for user similarity (random-hyperplane LSH)
+    ANN_ENABLED: bool = False
+    ANN_MIN_USERS: int = 50000  # exact search below this many users
+    ANN_NUM_TABLES: int = 16  # more tables -> higher recall
+    ANN_NUM_BITS: int = 12  # more bits -> smaller buckets, faster, lower recall
+    ANN_PROBE_RADIUS: int = 1  # also probe buckets this many bit flips away
+    
+    # implicit ALS matrix factorization (strategy='als')
+    ALS_FACTORS: int = 64
+    ALS_REGULARIZATION: float = 0.1
+    ALS_ALPHA: float = 10.0  # confidence = 1 + alpha * interaction weight
+    ALS_ITERATIONS: int = 15
+    ALS_CG_STEPS: int = 3  # conjugate-gradient steps per ALS half-iteration
+    
+    # ranked result cache (invalidated per user on interaction, globally on model rebuild)
+    RESULT_CACHE_BACKEND: str = "memory"  # 'memory' (per worker) or 'sqlite' (shared by workers on a host)
+    RESULT_CACHE_PATH: str = "./result_cache.db"  # sqlite backend only
+    RESULT_CACHE_TTL_SECONDS: float = 300.0
+    RESULT_CACHE_MAX_ENTRIES: int = 10000
+    
+    # bulk interaction ingestion (POST /interactions/bulk)
+    INTERACTION_BULK_BATCH_SIZE: int = 1000  # rows per insert + commit
+    INTERACTION_BULK_MAX_ROWS: int = 100000  # larger requests are rejected with 413
+    INTERACTION_BULK_MAX_BYTES: int = 32 * 1024 * 1024  # bodies over this are rejected with 413 before parsing
+    
+    # single-event tracking: 'sync' commits on the request path, 'write_behind' queues and flushes in batches
+    INTERACTION_WRITE_MODE: str = "sync"
+    WRITE_BEHIND_BATCH_SIZE: int = 500  # flush as soon as this many are queued
+    WRITE_BEHIND_FLUSH_MS: int = 200  # ... or at least this often
+    WRITE_BEHIND_MAX_QUEUE: int = 10000  # producers wait (then get 503) beyond this
+    WRITE_BEHIND_ENQUEUE_TIMEOUT_MS: int = 1000
+    WRITE_BEHIND_LOG_DIR: str = ""  # append log replayed after a crash (one subdirectory per worker); empty = memory only
+    WRITE_BEHIND_FSYNC: bool = True  # fsync each append (only with a log dir)
+    
+    # offline model artifacts
+    MODEL_DIR: str = "./models"
     
     # LLM explanation
+    LLM_BACKEND: str = "gemini"  # 'gemini', or 'fake' for offline load/latency testing
     LLM_MODEL: str = "gemini-1.5-pro"
     LLM_MAX_TOKENS: int = 300
     EXPLANATION_TEMPERATURE: float = 0.7
+    LLM_EXECUTOR_WORKERS: int = 8  # global cap: threads for blocking Gemini calls, extra calls queue
+    LLM_REQUEST_CONCURRENCY: int = 5  # concurrent explanation calls per response
+    EXPLAIN_BUDGET_MS: int = 0  # default explanation deadline per response; 0 = wait for every item
+    
+    # LLM circuit breaker: open on a high failure/slow-call rate, skip the API while open
+    LLM_BREAKER_WINDOW: int = 20  # recent calls considered
+    LLM_BREAKER_MIN_CALLS: int = 5  # calls needed in the window before it can open
+    LLM_BREAKER_FAILURE_RATE: float = 0.5
+    LLM_BREAKER_SLOW_CALL_MS: int = 8000  # slower calls count as failures
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0  # then one probe call decides (half-open)
+    
+    # fake LLM backend (LLM_BACKEND=fake)
+    LLM_FAKE_LATENCY_MS: float = 800.0  # median of a log-normal latency
+    LLM_FAKE_LATENCY_SIGMA: float = 0.5  # log-normal spread (0 = fixed latency)
+    LLM_FAKE_ERROR_RATE: float = 0.0
+    LLM_FAKE_TOKENS_PER_SECOND: float = 100.0  # output throughput added to latency
+    LLM_FAKE_SEED: int = 0
+    
+    # generated explanation cache (explanation_cache table + in-memory LRU)
+    EXPLANATION_CACHE_TTL_SECONDS: float = 604800.0  # 7 days
+    EXPLANATION_CACHE_MAX_ENTRIES: int = 50000  # rows kept in the explanation_cache table
+    EXPLANATION_CACHE_MEMORY_ENTRIES: int = 2000  # in-memory LRU in front of the table
     
     # server
     HOST: str = "0.0.0.0"
@@ -1,28 +1,96 @@
-from fastapi import FastAPI, Depends, HTTPException
+import json
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from contextlib import asynccontextmanager
 
 from app.config import get_settings
-from app.database import get_db, init_db
+from app.database import get_db, init_db, SessionLocal
 from app.models.product import Product, ProductSchema, ProductCreate
 from app.models.user import User, UserSchema, UserCreate
-from app.models.interaction import Interaction, InteractionCreate, InteractionSchema
+from app.models.interaction import Interaction, InteractionCreate, InteractionSchema, INTERACTION_WEIGHTS
+from app.models.recommendation import BatchRecommendationRequest
 from app.services.recommender import RecommenderEngine
+from app.services.batch_recommender import BatchRecommender
+from app.services.interaction_matrix import get_interaction_matrix
+from app.services.item_knn import get_item_knn_model
+from app.services.als import get_als_model
+from app.services.content_model import get_content_model, get_content_similarity_index
+from app.services.popularity import get_popularity_tracker
+from app.services.behavioral_profile import profile_lock
+from app.services.user_stats import category_stats, summarize
+from app.services.interaction_ingest import derived_updates, ingest_body, TooManyRowsError
+from app.services.write_behind import QueueFullError, get_write_behind_queue
+from app.services.result_cache import get_recommendation_cache
 from app.services.llm_explainer import LLMExplainer
+from app.services.llm_client import get_llm_client
 
 settings = get_settings()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup"""
+    """Initialize database and in-memory models on startup"""
     init_db()
+    
+    db = SessionLocal()
+    try:
+        interaction_matrix = get_interaction_matrix()
+        interaction_matrix.build(db)
+        
+        # offline-built item neighbours, or an in-memory build if none exists yet
+        item_knn = get_item_knn_model()
+        if not item_knn.load():
+            item_knn.build(interaction_matrix)
+        
+        # ALS is trained offline only; strategy='als' trains lazily if nothing was built
+        get_als_model().load()
+        
+        get_content_model().build(db)
+        similarity_index = get_content_similarity_index()
+        if not similarity_index.load():
+            similarity_index.build()
+        
+        get_popularity_tracker().load(db)
+        
+        # models were (re)loaded, so earlier cached rankings are stale
+        get_recommendation_cache().bump_version()
+    finally:
+        db.close()
+    
+    # write events a previous process queued but never flushed, then flush in the background
+    if settings.INTERACTION_WRITE_MODE == 'write_behind':
+        write_behind = get_write_behind_queue()
+        await run_in_threadpool(write_behind.replay)
+        await write_behind.start()
+    
+    # one Gemini client for the whole process, connected before the first request
+    await get_llm_client().warm_up()
+    
     print("✨ Heart&Mind Recommender System Started!")
     print(f"📊 Database: {settings.DATABASE_URL}")
     yield
     print("👋 Shutting down...")
+    
+    # drain queued interactions before the popularity counters they feed are persisted
+    if settings.INTERACTION_WRITE_MODE == 'write_behind':
+        try:
+            await get_write_behind_queue().stop()
+        except Exception as e:
+            print(f"⚠️  Final write-behind flush failed, events kept for replay: {e}")
+    
+    # persist popularity counters not yet flushed
+    db = SessionLocal()
+    try:
+        get_popularity_tracker().flush(db)
+    finally:
+        db.close()
+    
+    get_llm_client().close()
+    get_llm_client.cache_clear()
 
 
 # create FastAPI app
@@ -57,7 +125,7 @@ async def root():
 # PRODUCT ENDPOINTS
 
 @app.get("/products", response_model=List[ProductSchema])
-async def get_products(
+def get_products(
     category: Optional[str] = None,
     skip: int = 0,
     limit: int = 50,
@@ -74,7 +142,7 @@ async def get_products(
 
 
 @app.get("/products/{product_id}", response_model=ProductSchema)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, db: Session = Depends(get_db)):
     """Get single product by ID"""
     product = db.query(Product).filter(Product.id == product_id).first()
     
@@ -84,18 +152,46 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
     return product
 
 
+@app.get("/products/{product_id}/similar")
+def get_similar_products(product_id: int, n: int = 10, db: Session = Depends(get_db)):
+    """Get "more like this" products from the precomputed content-similarity index"""
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    neighbours = get_content_similarity_index().similar(product_id, n)
+    
+    similar_ids = [pid for pid, _ in neighbours]
+    product_map = {
+        p.id: p for p in db.query(Product).filter(Product.id.in_(similar_ids)).all()
+    }
+    
+    return {
+        "product_id": product_id,
+        "similar": [
+            {"product_id": pid, "score": score, "product": product_map[pid].to_dict()}
+            for pid, score in neighbours
+            if pid in product_map
+        ]
+    }
+
+
 @app.post("/products", response_model=ProductSchema)
-async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
+def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     """Create a new product"""
     db_product = Product(**product.model_dump())
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    
+    # extend the shared TF-IDF model instead of refitting per request
+    get_content_model().add_product(db_product)
+    
     return db_product
 
 
 @app.get("/categories")
-async def get_categories(db: Session = Depends(get_db)):
+def get_categories(db: Session = Depends(get_db)):
     """Get all unique categories"""
     categories = db.query(Product.category).distinct().all()
     return [c[0] for c in categories]
@@ -104,14 +200,14 @@ async def get_categories(db: Session = Depends(get_db)):
 # USER ENDPOINTS
 
 @app.get("/users", response_model=List[UserSchema])
-async def get_users(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+def get_users(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
     """Get all users"""
     users = db.query(User).offset(skip).limit(limit).all()
     return users
 
 
 @app.get("/users/{user_id}", response_model=UserSchema)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_db)):
     """Get single user by ID"""
     user = db.query(User).filter(User.id == user_id).first()
     
@@ -122,7 +218,7 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/users", response_model=UserSchema)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """Create a new user"""
     # check if email exists
     existing = db.query(User).filter(User.email == user.email).first()
@@ -139,7 +235,7 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
 # INTERACTION ENDPOINTS
 
 @app.post("/interactions", response_model=InteractionSchema)
-async def track_interaction(
+def track_interaction(
     interaction: InteractionCreate,
     db: Session = Depends(get_db)
 ):
@@ -153,24 +249,89 @@ async def track_interaction(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    # acknowledge now and let the background flush write it with the next batch
+    if settings.INTERACTION_WRITE_MODE == 'write_behind':
+        try:
+            sequence = get_write_behind_queue().enqueue(interaction)
+        except QueueFullError as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Interaction queue is full ({e}), retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        
+        return JSONResponse(status_code=202, content={
+            "status": "queued",
+            "sequence": sequence,
+            "user_id": interaction.user_id,
+            "product_id": interaction.product_id
+        })
+    
     # set weight based on interaction type
-    weights = {'view': 1.0, 'cart': 2.0, 'wishlist': 3.0, 'purchase': 5.0, 'rating': 4.0}
-    weight = weights.get(interaction.interaction_type, 1.0)
+    weight = INTERACTION_WEIGHTS.get(interaction.interaction_type, 1.0)
     
     db_interaction = Interaction(
         **interaction.model_dump(),
         weight=weight
     )
     
-    db.add(db_interaction)
-    db.commit()
+    # profile and rollup are saved with this commit; popularity, matrix and cache follow it
+    with derived_updates(db, [interaction], {user.id: user}, {product.id: product}) as inserted_ids:
+        db.add(db_interaction)
+        db.flush()
+        inserted_ids.append(db_interaction.id)
+        db.commit()
+    
     db.refresh(db_interaction)
     
     return db_interaction
 
 
+@app.post("/interactions/bulk")
+async def track_interactions_bulk(request: Request, db: Session = Depends(get_db)):
+    """
+    Track many interactions in one request: a JSON array, or NDJSON (one object per line)
+    
+    Rows are written in batches of INTERACTION_BULK_BATCH_SIZE. Invalid rows (bad JSON,
+    missing fields, unknown user or product) are skipped and reported by their 0-based
+    position (array index or line number); the rest are stored.
+    """
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"At most {settings.INTERACTION_BULK_MAX_ROWS} interactions "
+               f"({settings.INTERACTION_BULK_MAX_BYTES} bytes) per request"
+    )
+    
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > settings.INTERACTION_BULK_MAX_BYTES:
+        raise too_large
+    
+    body = await request.body()
+    if len(body) > settings.INTERACTION_BULK_MAX_BYTES:
+        raise too_large
+    ndjson = 'ndjson' in request.headers.get('content-type', '')
+    
+    # decoding + validating 100k rows takes most of a second: keep it off the event loop
+    try:
+        received, inserted, errors = await run_in_threadpool(
+            ingest_body, db, body, ndjson,
+            settings.INTERACTION_BULK_BATCH_SIZE, settings.INTERACTION_BULK_MAX_ROWS
+        )
+    except TooManyRowsError:
+        raise too_large
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid body: {e}")
+    
+    return {
+        "received": received,
+        "inserted": inserted,
+        "failed": len(errors),
+        "errors": errors
+    }
+
+
 @app.get("/users/{user_id}/interactions", response_model=List[InteractionSchema])
-async def get_user_interactions(
+def get_user_interactions(
     user_id: int,
     skip: int = 0,
     limit: int = 50,
@@ -194,6 +355,9 @@ async def get_recommendations(
     n: int = 10,
     personality: str = 'friendly',
     include_explanations: bool = True,
+    strategy: str = 'hybrid',
+    explanation_mode: str = 'individual',
+    explain_budget_ms: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -204,15 +368,28 @@ async def get_recommendations(
         n: Number of recommendations
         personality: Explanation style ('friendly', 'expert', 'storyteller', 'minimalist')
         include_explanations: Whether to generate LLM explanations
+        strategy: Recommender mode ('hybrid', 'item_knn', 'als')
+        explanation_mode: 'individual' (one LLM call per item) or 'batched' (one call for all items)
+        explain_budget_ms: Explanation deadline; late items get a fallback text (default EXPLAIN_BUDGET_MS, 0 = none)
     """
-    # validate user
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    if strategy not in RecommenderEngine.STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy '{strategy}'")
+    if explanation_mode not in LLMExplainer.EXPLANATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown explanation_mode '{explanation_mode}'")
     
-    # get recommendations
-    engine = RecommenderEngine(db)
-    recommendations = engine.get_recommendations(user_id, n)
+    def rank() -> Optional[List[dict]]:
+        # validate user
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+        
+        # get recommendations
+        engine = RecommenderEngine(db)
+        return engine.get_recommendations(user_id, n, strategy=strategy)
+    
+    recommendations = await run_in_threadpool(rank)
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
     if not recommendations:
         return {
@@ -227,7 +404,9 @@ async def get_recommendations(
         recommendations = await explainer.batch_explain(
             user_id=user_id,
             recommendations=recommendations,
-            personality=personality
+            personality=personality,
+            mode=explanation_mode,
+            budget_ms=explain_budget_ms if explain_budget_ms is not None else settings.EXPLAIN_BUDGET_MS
         )
     
     return {
@@ -238,6 +417,129 @@ async def get_recommendations(
     }
 
 
+@app.get("/recommendations/{user_id}/stream")
+async def stream_recommendations(
+    user_id: int,
+    n: int = 10,
+    personality: str = 'friendly',
+    strategy: str = 'hybrid',
+    db: Session = Depends(get_db)
+):
+    """
+    Server-sent events: the ranked products first, then one event per explanation as it finishes
+    
+    Events: 'recommendations' (ranked list, no explanations), 'explanation'
+    (rank index + explained item, in completion order) and finally 'done'.
+    """
+    if strategy not in RecommenderEngine.STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy '{strategy}'")
+    
+    user = await run_in_threadpool(db.get, User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    def event(name: str, data: dict) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+    
+    async def stream():
+        # the stream outlives the request scope, so it owns its session
+        db = SessionLocal()
+        try:
+            recommendations = await run_in_threadpool(
+                RecommenderEngine(db).get_recommendations, user_id, n, strategy=strategy
+            )
+            yield event("recommendations", {
+                "user_id": user_id,
+                "personality": personality,
+                "count": len(recommendations),
+                "recommendations": recommendations
+            })
+            
+            if recommendations:
+                explainer = LLMExplainer(db)
+                async for index, item in explainer.stream_explain(user_id, recommendations, personality):
+                    yield event("explanation", {"index": index, **item})
+            
+            yield event("done", {"user_id": user_id})
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/recommendations/batch")
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """
+    Recommendations for many users in one call, streamed as NDJSON (one line per user)
+    
+    Users are scored a chunk at a time with sparse matrix products; explanations are
+    off by default so nightly jobs can score the whole user base cheaply.
+    """
+    if request.strategy not in RecommenderEngine.STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy '{request.strategy}'")
+    if request.explanation_mode not in LLMExplainer.EXPLANATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown explanation_mode '{request.explanation_mode}'")
+    
+    async def stream():
+        # the stream outlives the request scope, so it owns its session
+        db = SessionLocal()
+        try:
+            batch = BatchRecommender(db)
+            explainer = LLMExplainer(db) if request.include_explanations else None
+            
+            # sizing reads the database and can rebuild the matrix, so it runs off the event loop too
+            chunk_size = await run_in_threadpool(batch.chunk_size)
+            for chunk in batch.chunks(request.user_ids, chunk_size):
+                results = await run_in_threadpool(
+                    batch.recommend_chunk, chunk, request.n, request.strategy
+                )
+                
+                for user_id, recommendations in results:
+                    if recommendations is None:
+                        line = {"user_id": user_id, "error": "User not found"}
+                    else:
+                        if explainer and recommendations:
+                            recommendations = await explainer.batch_explain(
+                                user_id=user_id,
+                                recommendations=recommendations,
+                                personality=request.personality,
+                                mode=request.explanation_mode
+                            )
+                        line = {
+                            "user_id": user_id,
+                            "count": len(recommendations),
+                            "recommendations": recommendations
+                        }
+                    
+                    yield json.dumps(line) + "\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss/eviction counters of the recommendation result cache"""
+    return get_recommendation_cache().stats()
+
+
+@app.get("/interactions/queue/stats")
+async def get_write_behind_stats():
+    """Depth, sequence numbers and flush counters of the write-behind interaction queue"""
+    return {"mode": settings.INTERACTION_WRITE_MODE, **get_write_behind_queue().stats()}
+
+
+@app.get("/llm/stats")
+async def get_llm_stats():
+    """Circuit breaker state and call counters for the LLM backend"""
+    return get_llm_client().breaker.stats()
+
+
 @app.get("/recommendations/{user_id}/explain/{product_id}")
 async def explain_specific_recommendation(
     user_id: int,
@@ -246,12 +548,12 @@ async def explain_specific_recommendation(
     db: Session = Depends(get_db)
 ):
     """Get explanation for why a specific product is recommended"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await run_in_threadpool(db.get, Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     explainer = LLMExplainer(db)
-    explanation = await explainer.explain_recommendation(
+    explanation, source = await explainer.explain_with_status(
         user_id=user_id,
         product=product.to_dict(),
         recommendation_source='content',
@@ -262,51 +564,28 @@ async def explain_specific_recommendation(
         "user_id": user_id,
         "product_id": product_id,
         "product": product.to_dict(),
-        "explanation": explanation
+        "explanation": explanation,
+        "explanation_source": source,
+        "cache_status": 'hit' if source == 'cache' else 'miss'
     }
 
 
 # ANALYTICS ENDPOINTS
 
 @app.get("/analytics/user/{user_id}")
-async def get_user_analytics(user_id: int, db: Session = Depends(get_db)):
-    """Get user behavior analytics"""
-    interactions = db.query(Interaction).filter(
-        Interaction.user_id == user_id
-    ).all()
+def get_user_analytics(user_id: int, db: Session = Depends(get_db)):
+    """Get user behavior analytics (served from the per-user category rollup)"""
+    with profile_lock(user_id):
+        rows = category_stats(db, user_id)
     
-    if not interactions:
+    if not rows:
         return {
             "user_id": user_id,
             "total_interactions": 0,
             "message": "No interaction data yet"
         }
     
-    # calculate statistics
-    product_ids = [i.product_id for i in interactions]
-    products = db.query(Product).filter(Product.id.in_(product_ids)).all()
-    
-    categories = {}
-    total_value = 0
-    purchases = 0
-    
-    for interaction in interactions:
-        product = next((p for p in products if p.id == interaction.product_id), None)
-        if product:
-            categories[product.category] = categories.get(product.category, 0) + 1
-            
-            if interaction.interaction_type == 'purchase':
-                total_value += product.price
-                purchases += 1
-    
-    return {
-        "user_id": user_id,
-        "total_interactions": len(interactions),
-        "categories_explored": categories,
-        "total_purchases": purchases,
-        "total_spent": round(total_value, 2),
-        "favorite_category": max(categories, key=categories.get) if categories else None
-    }
+    return {"user_id": user_id, **summarize(rows)}
 
 
 if __name__ == "__main__":
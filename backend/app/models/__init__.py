@@ -4,9 +4,17 @@ Database models for Heart&Mind
 from app.models.product import Product, ProductSchema, ProductCreate
 from app.models.user import User, UserSchema, UserCreate
 from app.models.interaction import Interaction, InteractionSchema, InteractionCreate
+from app.models.popularity import ProductPopularity
+from app.models.user_stats import UserCategoryStats
+from app.models.explanation_cache import CachedExplanation
+from app.models.recommendation import BatchRecommendationRequest
 
 __all__ = [
     'Product', 'ProductSchema', 'ProductCreate',
     'User', 'UserSchema', 'UserCreate',
-    'Interaction', 'InteractionSchema', 'InteractionCreate'
+    'Interaction', 'InteractionSchema', 'InteractionCreate',
+    'ProductPopularity',
+    'UserCategoryStats',
+    'CachedExplanation',
+    'BatchRecommendationRequest'
 ]
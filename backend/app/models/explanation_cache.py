@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Text, DateTime
+from app.database import Base
+
+
+class CachedExplanation(Base):
+    """Persisted LLM explanation (maintained by ExplanationCache)"""
+    __tablename__ = "explanation_cache"
+    
+    # sha256 of (user context fingerprint, product, personality, model, prompt version)
+    key = Column(String(64), primary_key=True)
+    explanation = Column(Text, nullable=False)
+    
+    # UTC times; created_at drives the TTL, last_used the LRU eviction
+    created_at = Column(DateTime, nullable=False)
+    last_used = Column(DateTime, nullable=False, index=True)
\ No newline at end of file
@@ -6,6 +6,16 @@ from datetime import datetime
 from app.database import Base
 
 
+# implicit feedback strength per interaction type
+INTERACTION_WEIGHTS = {
+    'view': 1.0,
+    'cart': 2.0,
+    'wishlist': 3.0,
+    'purchase': 5.0,
+    'rating': 4.0
+}
+
+
 class Interaction(Base):
     """User-Product interaction tracking"""
     __tablename__ = "interactions"
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from app.database import Base
+
+
+class ProductPopularity(Base):
+    """Time-decayed popularity summary per product (maintained by PopularityTracker)"""
+    __tablename__ = "product_popularity"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    
+    # sum of interaction weights, exponentially decayed to updated_at
+    score = Column(Float, nullable=False, default=0.0)
+    interaction_count = Column(Integer, nullable=False, default=0)
+    
+    # UTC time of the flush that wrote this row
+    updated_at = Column(DateTime, nullable=False, index=True)
+    
+    # highest interactions.id counted at that flush; load() replays rows above it
+    last_interaction_id = Column(Integer, nullable=True)
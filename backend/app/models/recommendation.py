@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class BatchRecommendationRequest(BaseModel):
+    """Schema for scoring many users in one call"""
+    user_ids: List[int]
+    n: int = 10
+    strategy: str = 'hybrid'
+    include_explanations: bool = False
+    personality: str = 'friendly'
+    explanation_mode: str = 'individual'
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from app.database import Base
+
+
+class UserCategoryStats(Base):
+    """Per-user, per-category interaction rollup (maintained by app.services.user_stats)"""
+    __tablename__ = "user_category_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category = Column(String, primary_key=True)
+    
+    interaction_count = Column(Integer, nullable=False, default=0)
+    purchase_count = Column(Integer, nullable=False, default=0)
+    total_spent = Column(Float, nullable=False, default=0.0)
+    
+    # UTC time of the last interaction folded in
+    updated_at = Column(DateTime, nullable=False)
\ No newline at end of file
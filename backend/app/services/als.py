@@ -0,0 +1,217 @@
+import os
+import threading
+import numpy as np
+from scipy import sparse
+from typing import Dict, Iterable, List, Optional, Tuple
+from functools import lru_cache
+
+from app.services.interaction_matrix import InteractionMatrix
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class ALSModel:
+    """
+    Implicit-feedback matrix factorization (Hu, Koren & Volinsky 2008)
+    Trained offline with conjugate-gradient ALS; served as a dense dot product
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        factors: int = 64,
+        regularization: float = 0.1,
+        alpha: float = 10.0,
+        iterations: int = 15,
+        cg_steps: int = 3,
+        seed: int = 0
+    ):
+        self.path = path
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha  # confidence = 1 + alpha * interaction weight
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.seed = seed
+        
+        self.user_factors: Optional[np.ndarray] = None
+        self.item_factors: Optional[np.ndarray] = None
+        self.user_ids = np.zeros(0, dtype=np.int64)
+        self.product_ids = np.zeros(0, dtype=np.int64)
+        self.user_index: Dict[int, int] = {}
+        self.product_index: Dict[int, int] = {}
+        self._gramian: Optional[np.ndarray] = None  # Y^T Y, cached for fold-in
+        self._train_lock = threading.Lock()
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.item_factors is not None
+    
+    def ensure_trained(self, interaction_matrix: InteractionMatrix) -> None:
+        """Train once if no factors were loaded; concurrent callers wait for the same fit"""
+        if self.is_trained:
+            return
+        with self._train_lock:
+            if not self.is_trained:
+                self.fit(interaction_matrix)
+    
+    def fit(self, interaction_matrix: InteractionMatrix) -> None:
+        """Alternate user and item solves over the weighted interaction matrix"""
+        matrix = interaction_matrix.matrix
+        n_users, n_items = matrix.shape
+        
+        # confidence minus one, so zero entries stay implicit
+        confidence = sparse.csr_matrix(matrix * self.alpha, dtype=np.float64)
+        confidence_t = sparse.csr_matrix(confidence.T)
+        
+        rng = np.random.default_rng(self.seed)
+        user_factors = rng.normal(scale=0.01, size=(n_users, self.factors))
+        item_factors = rng.normal(scale=0.01, size=(n_items, self.factors))
+        
+        for _ in range(self.iterations):
+            user_factors = self._solve(confidence, user_factors, item_factors)
+            item_factors = self._solve(confidence_t, item_factors, user_factors)
+        
+        self._publish(
+            interaction_matrix.user_ids[:n_users],
+            interaction_matrix.product_ids[:n_items],
+            user_factors,
+            item_factors
+        )
+    
+    def _solve(
+        self,
+        confidence: sparse.csr_matrix,
+        X: np.ndarray,
+        Y: np.ndarray
+    ) -> np.ndarray:
+        """
+        A few conjugate-gradient steps on every row of X at once, warm-started from X
+        Solves (Y^T C_u Y + reg I) x_u = Y^T C_u p_u with p_u = 1 on observed items
+        """
+        YtY = Y.T @ Y + self.regularization * np.eye(self.factors)
+        rows = np.repeat(np.arange(confidence.shape[0]), np.diff(confidence.indptr))
+        cols = confidence.indices
+        
+        def apply_a(V: np.ndarray) -> np.ndarray:
+            # YtY v_u + sum_i (c_ui - 1) (y_i . v_u) y_i
+            dots = np.einsum('ij,ij->i', V[rows], Y[cols])
+            weighted = sparse.csr_matrix(
+                (confidence.data * dots, confidence.indices, confidence.indptr),
+                shape=confidence.shape
+            )
+            return V @ YtY + weighted @ Y
+        
+        # b_u = sum_i c_ui y_i
+        b = sparse.csr_matrix(
+            (confidence.data + 1.0, confidence.indices, confidence.indptr),
+            shape=confidence.shape
+        ) @ Y
+        
+        X = X.copy()
+        r = b - apply_a(X)
+        p = r.copy()
+        rs_old = np.einsum('ij,ij->i', r, r)
+        
+        for _ in range(self.cg_steps):
+            Ap = apply_a(p)
+            denom = np.einsum('ij,ij->i', p, Ap)
+            step = np.divide(rs_old, denom, out=np.zeros_like(rs_old), where=denom > 0)
+            
+            X += step[:, None] * p
+            r -= step[:, None] * Ap
+            
+            rs_new = np.einsum('ij,ij->i', r, r)
+            beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+            p = r + beta[:, None] * p
+            rs_old = rs_new
+        
+        return X
+    
+    def user_vector(self, user_id: int, history: Dict[int, float]) -> Optional[np.ndarray]:
+        """Trained factors, or a one-off fold-in solve for users unseen at training time"""
+        row = self.user_index.get(user_id)
+        if row is not None:
+            return self.user_factors[row]
+        
+        positions = [self.product_index[pid] for pid in history if pid in self.product_index]
+        if not positions:
+            return None
+        
+        Y = self.item_factors[positions].astype(np.float64)
+        confidence = self.alpha * np.array(
+            [history[int(self.product_ids[pos])] for pos in positions]
+        )
+        A = self._gramian + (Y.T * confidence) @ Y + self.regularization * np.eye(self.factors)
+        b = Y.T @ (confidence + 1.0)
+        
+        return np.linalg.solve(A, b).astype(np.float32)
+    
+    def recommend(
+        self,
+        user_vector: np.ndarray,
+        n: int,
+        exclude: Iterable[int] = ()
+    ) -> List[Tuple[int, float]]:
+        """Top-n (product_id, score) by dot product, skipping excluded products"""
+        scores = self.item_factors @ user_vector
+        
+        excluded = [self.product_index[pid] for pid in exclude if pid in self.product_index]
+        scores[excluded] = -np.inf
+        
+        n = min(n, scores.size - len(excluded))
+        if n <= 0:
+            return []
+        
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.product_ids[idx]), float(scores[idx])) for idx in top]
+    
+    def save(self) -> None:
+        if not self.is_trained:
+            return
+        
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        np.savez_compressed(
+            self.path,
+            user_ids=self.user_ids,
+            product_ids=self.product_ids,
+            user_factors=self.user_factors,
+            item_factors=self.item_factors
+        )
+    
+    def load(self) -> bool:
+        """Load persisted factors; returns False if the model has not been trained yet"""
+        if not os.path.exists(self.path):
+            return False
+        
+        data = np.load(self.path)
+        self._publish(data['user_ids'], data['product_ids'], data['user_factors'], data['item_factors'])
+        return True
+    
+    def _publish(self, user_ids, product_ids, user_factors: np.ndarray, item_factors: np.ndarray) -> None:
+        """Install new factors; item_factors goes last since it is what makes is_trained true"""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        user_index = {int(uid): idx for idx, uid in enumerate(user_ids)}
+        product_index = {int(pid): idx for idx, pid in enumerate(product_ids)}
+        gramian = item_factors.astype(np.float64).T @ item_factors.astype(np.float64)
+        
+        self.user_ids, self.product_ids = user_ids, product_ids
+        self.user_index, self.product_index = user_index, product_index
+        self.user_factors, self._gramian = user_factors.astype(np.float32), gramian
+        self.item_factors = item_factors.astype(np.float32)
+
+
+@lru_cache()
+def get_als_model() -> ALSModel:
+    """Get the shared ALS model instance"""
+    return ALSModel(
+        path=os.path.join(settings.MODEL_DIR, 'als.npz'),
+        factors=settings.ALS_FACTORS,
+        regularization=settings.ALS_REGULARIZATION,
+        alpha=settings.ALS_ALPHA,
+        iterations=settings.ALS_ITERATIONS,
+        cg_steps=settings.ALS_CG_STEPS
+    )
@@ -0,0 +1,208 @@
+import threading
+import itertools
+import numpy as np
+from scipy import sparse
+from typing import Dict, List, Optional
+from collections import defaultdict
+from functools import lru_cache
+
+from app.services.interaction_matrix import get_interaction_matrix
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class LSHIndex:
+    """
+    Random-hyperplane LSH for approximate cosine nearest neighbours (NumPy only)
+    
+    Knobs:
+        num_tables: more tables -> higher recall, more candidates to score
+        num_bits: more bits per table -> smaller buckets, faster but lower recall
+        probe_radius: also probe buckets within this Hamming distance (0-2)
+    """
+    
+    def __init__(
+        self,
+        num_tables: int = 16,
+        num_bits: int = 12,
+        probe_radius: int = 1,
+        seed: int = 0,
+        rebuild_ratio: float = 0.1
+    ):
+        if num_bits > 63:
+            raise ValueError("num_bits must fit in a 64-bit bucket code")
+        
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.probe_radius = probe_radius
+        self.rebuild_ratio = rebuild_ratio  # re-sort tables once this share of rows moved
+        
+        self.planes = np.zeros((0, num_tables * num_bits), dtype=np.float32)
+        self.codes = np.zeros((0, num_tables), dtype=np.uint64)
+        self.size = 0
+        
+        self._rng = np.random.default_rng(seed)
+        self._bit_values = np.left_shift(np.uint64(1), np.arange(num_bits, dtype=np.uint64))
+        self._sorted_codes: List[np.ndarray] = []
+        self._sorted_rows: List[np.ndarray] = []
+        self._overflow = [defaultdict(set) for _ in range(num_tables)]
+        self._overflow_size = 0
+        self._dirty: Dict[int, int] = {}  # row -> matrix version that changed it
+        self._needs_build = True
+        self._build_version = 0  # a full build needs a matrix at least this new
+        self._lock = threading.RLock()
+    
+    def build(self, matrix: sparse.csr_matrix, chunk_size: int = 100000, version: Optional[int] = None) -> None:
+        """Hash every row of the matrix and sort the bucket tables"""
+        with self._lock:
+            self.codes = np.zeros((matrix.shape[0], self.num_tables), dtype=np.uint64)
+            for start in range(0, matrix.shape[0], chunk_size):
+                self.codes[start:start + chunk_size] = self._hash(matrix[start:start + chunk_size])
+            
+            self.size = matrix.shape[0]
+            self._dirty = {row: changed for row, changed in self._dirty.items() if not self._covers(version, changed)}
+            self._needs_build = False
+            self._reindex()
+    
+    def mark_dirty(self, rows: Optional[np.ndarray], version: int = 0) -> None:
+        """Interaction matrix listener: rows changed (in this matrix version), or None after a full rebuild"""
+        with self._lock:
+            if rows is None:
+                self._needs_build = True
+                self._build_version = version
+                self._dirty.clear()
+            else:
+                for row in rows:
+                    self._dirty[int(row)] = max(version, self._dirty.get(int(row), 0))
+    
+    def sync(self, matrix: sparse.csr_matrix, version: Optional[int] = None) -> None:
+        """
+        Insert new rows and re-hash changed rows from the given matrix
+        version is the matrix's version (None = current); rows changed after it stay dirty,
+        and an older snapshot never shrinks the index
+        """
+        with self._lock:
+            if self._needs_build:
+                if self._covers(version, self._build_version):
+                    self.build(matrix, version=version)
+                return
+            
+            fresh = [row for row, changed in self._dirty.items() if row < matrix.shape[0] and self._covers(version, changed)]
+            rows = set(fresh) | set(range(self.size, matrix.shape[0]))
+            if not rows:
+                return
+            
+            rows = np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+            codes = self._hash(matrix[rows])
+            
+            if matrix.shape[0] > self.codes.shape[0]:
+                grown = np.zeros((matrix.shape[0], self.num_tables), dtype=np.uint64)
+                grown[:self.codes.shape[0]] = self.codes
+                self.codes = grown
+            self.codes[rows] = codes
+            self.size = max(self.size, matrix.shape[0])
+            
+            # new positions go to small per-table overflow buckets until the next re-sort
+            for row, row_codes in zip(rows, codes):
+                for table, code in enumerate(row_codes):
+                    self._overflow[table][int(code)].add(int(row))
+            
+            self._overflow_size += len(rows)
+            for row in fresh:
+                del self._dirty[row]
+            if self._overflow_size > self.rebuild_ratio * self.size:
+                self._reindex()
+    
+    def query(self, matrix: sparse.csr_matrix, row: int, version: Optional[int] = None) -> np.ndarray:
+        """
+        sync() and candidates() under one lock, clipped to the caller's matrix
+        Another thread may have synced a newer, larger snapshot; rows past this one are dropped.
+        If the index cannot cover the row from this snapshot, every row is a candidate (exact search)
+        """
+        with self._lock:
+            self.sync(matrix, version)
+            if self._needs_build or row >= self.size:
+                return np.arange(matrix.shape[0])
+            found = self.candidates(row)
+        return found[found < matrix.shape[0]]
+    
+    def candidates(self, row: int) -> np.ndarray:
+        """
+        Rows sharing a (probed) bucket with the given row in any table
+        May include a few stale rows re-hashed since the last re-sort; callers score candidates exactly
+        """
+        with self._lock:
+            hit = np.zeros(self.size, dtype=bool)
+            
+            for table in range(self.num_tables):
+                probes = np.array(self._probes(int(self.codes[row, table])), dtype=np.uint64)
+                sorted_codes, sorted_rows = self._sorted_codes[table], self._sorted_rows[table]
+                
+                starts = np.searchsorted(sorted_codes, probes, side='left')
+                ends = np.searchsorted(sorted_codes, probes, side='right')
+                for lo, hi in zip(starts, ends):
+                    if hi > lo:
+                        hit[sorted_rows[lo:hi]] = True
+                
+                overflow = self._overflow[table]
+                if overflow:
+                    for code in probes:
+                        extra = overflow.get(int(code))
+                        if extra:
+                            hit[list(extra)] = True
+            
+            hit[row] = False
+            return np.flatnonzero(hit)
+    
+    @staticmethod
+    def _covers(version: Optional[int], changed: int) -> bool:
+        """Whether a matrix of this version (None = current) already includes a change made in `changed`"""
+        return version is None or version >= changed
+    
+    def _hash(self, vectors: sparse.csr_matrix) -> np.ndarray:
+        """Bucket code per table from the signs of hyperplane projections"""
+        if vectors.shape[1] > self.planes.shape[0]:
+            # new products: extend planes, earlier signatures stay valid (those columns were zero)
+            extra = self._rng.standard_normal(
+                (vectors.shape[1] - self.planes.shape[0], self.planes.shape[1])
+            ).astype(np.float32)
+            self.planes = np.vstack([self.planes, extra])
+        
+        projections = np.asarray(vectors @ self.planes[:vectors.shape[1]])
+        bits = (projections > 0).reshape(-1, self.num_tables, self.num_bits)
+        return (bits * self._bit_values).sum(axis=2, dtype=np.uint64)
+    
+    def _probes(self, code: int) -> List[int]:
+        """The bucket code itself plus codes within probe_radius bit flips"""
+        probes = [code]
+        for radius in range(1, self.probe_radius + 1):
+            for bits in itertools.combinations(range(self.num_bits), radius):
+                flipped = code
+                for bit in bits:
+                    flipped ^= 1 << bit
+                probes.append(flipped)
+        return probes
+    
+    def _reindex(self) -> None:
+        self._sorted_codes, self._sorted_rows = [], []
+        for table in range(self.num_tables):
+            order = np.argsort(self.codes[:self.size, table], kind='stable')
+            self._sorted_codes.append(self.codes[order, table])
+            self._sorted_rows.append(order)
+        
+        self._overflow = [defaultdict(set) for _ in range(self.num_tables)]
+        self._overflow_size = 0
+
+
+@lru_cache()
+def get_user_ann_index() -> LSHIndex:
+    """Get the shared user LSH index, kept in sync with the interaction matrix"""
+    index = LSHIndex(
+        num_tables=settings.ANN_NUM_TABLES,
+        num_bits=settings.ANN_NUM_BITS,
+        probe_radius=settings.ANN_PROBE_RADIUS
+    )
+    interaction_matrix = get_interaction_matrix()
+    interaction_matrix.add_listener(lambda rows: index.mark_dirty(rows, interaction_matrix.version))
+    return index
@@ -0,0 +1,286 @@
+import numpy as np
+from scipy import sparse
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+from app.models.user import User
+from app.models.interaction import Interaction
+from app.services.recommender import RecommenderEngine
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class BatchRecommender:
+    """
+    Recommendations for many users in one pass
+    Users are scored a chunk at a time with sparse matrix-matrix products
+    (no serendipity picks; ANN is not used, similarities are exact)
+    """
+    
+    MAX_DENSE_CELLS = 8_000_000  # bound on chunk x catalog score matrices
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.engine = RecommenderEngine(db)
+    
+    def chunk_size(self) -> int:
+        """Users per chunk so dense score blocks stay bounded (may build the matrix, so call it off the event loop)"""
+        self.engine.interaction_matrix.ensure_built(self.db)
+        n_products = max(
+            1,
+            self.engine.interaction_matrix.matrix.shape[1],
+            len(self.engine.content_model.product_ids)
+        )
+        return max(1, min(256, self.MAX_DENSE_CELLS // n_products))
+    
+    @staticmethod
+    def chunks(user_ids: Sequence[int], chunk_size: int) -> Iterator[List[int]]:
+        """Split user ids into chunks of chunk_size"""
+        for start in range(0, len(user_ids), chunk_size):
+            yield list(user_ids[start:start + chunk_size])
+    
+    def recommend_chunk(
+        self,
+        user_ids: List[int],
+        n: int = 10,
+        strategy: str = 'hybrid'
+    ) -> List[Tuple[int, Optional[List[Dict]]]]:
+        """(user_id, recommendations) in input order; None for unknown users"""
+        engine = self.engine
+        engine.interaction_matrix.ensure_built(self.db)
+        
+        existing = {uid for (uid,) in self.db.query(User.id).filter(User.id.in_(user_ids)).all()}
+        counts = dict(
+            self.db.query(Interaction.user_id, func.count(Interaction.id))
+            .filter(Interaction.user_id.in_(user_ids))
+            .group_by(Interaction.user_id)
+            .all()
+        )
+        
+        matrix, normalized, _ = engine.interaction_matrix.snapshot()
+        warm_users, warm_rows = [], []
+        for uid in dict.fromkeys(user_ids):
+            row = engine.interaction_matrix.user_row(uid)
+            if (
+                uid in existing
+                and counts.get(uid, 0) >= settings.MIN_INTERACTIONS_FOR_COLLABORATIVE
+                and row is not None and row < matrix.shape[0]
+            ):
+                warm_users.append(uid)
+                warm_rows.append(row)
+        
+        ranked: Dict[int, List[Dict]] = {}
+        if warm_users:
+            rows = np.array(warm_rows, dtype=np.int64)
+            if strategy == 'item_knn':
+                ranked = self._item_knn(warm_users, rows, matrix, n)
+            elif strategy == 'als':
+                ranked = self._als(warm_users, rows, matrix, n)
+            else:
+                ranked = self._hybrid(warm_users, rows, matrix, normalized, n)
+        
+        # cold start users all share the popularity list
+        engine.popularity.ensure_loaded(self.db)
+        popular = [
+            {'product_id': pid, 'score': float(score), 'source': 'popularity'}
+            for pid, score in engine.popularity.top(n)
+        ]
+        
+        # one product query for the whole chunk
+        product_ids = {rec['product_id'] for recs in ranked.values() for rec in recs}
+        product_ids.update(rec['product_id'] for rec in popular)
+        product_map = {
+            p.id: p.to_dict()
+            for p in self.db.query(Product).filter(Product.id.in_(product_ids)).all()
+        }
+        
+        results = []
+        for uid in user_ids:
+            if uid not in existing:
+                results.append((uid, None))
+                continue
+            
+            recs = ranked.get(uid, popular)
+            results.append((uid, [
+                {**rec, 'product': product_map[rec['product_id']]}
+                for rec in recs
+                if rec['product_id'] in product_map
+            ]))
+        
+        return results
+    
+    def _hybrid(
+        self,
+        user_ids: List[int],
+        rows: np.ndarray,
+        matrix: sparse.csr_matrix,
+        normalized: sparse.csr_matrix,
+        n: int
+    ) -> Dict[int, List[Dict]]:
+        """0.6 x user-based CF + 0.4 x content, same scoring as the per-user path"""
+        engine = self.engine
+        engine.content_model.ensure_built(self.db)
+        histories = sparse.csr_matrix(matrix[rows])
+        matrix_product_ids = engine.interaction_matrix.product_ids[:matrix.shape[1]]
+        
+        # user-user similarities for the whole chunk, then top-10 neighbours per user
+        similarities = sparse.csr_matrix(normalized[rows] @ normalized.T)
+        similarities.sort_indices()
+        neighbour_rows, neighbour_cols, neighbour_weights = [], [], []
+        for i, row in enumerate(rows):
+            lo, hi = similarities.indptr[i], similarities.indptr[i + 1]
+            cols, sims = similarities.indices[lo:hi], similarities.data[lo:hi].copy()
+            sims[cols == row] = 0.0
+            top = engine._top_k_indices(sims, 10)
+            neighbour_rows.extend([i] * top.size)
+            neighbour_cols.extend(cols[top])
+            neighbour_weights.extend(sims[top])
+        
+        neighbours = sparse.csr_matrix(
+            (neighbour_weights, (neighbour_rows, neighbour_cols)),
+            shape=(len(rows), matrix.shape[0])
+        )
+        collab = (neighbours @ matrix).toarray()  # chunk x matrix columns
+        
+        # content profiles: normalized sum of interacted products' TF-IDF rows
+        content_model = engine.content_model
+        with content_model._lock:
+            tfidf, content_index = content_model.matrix, content_model.product_index
+            content_product_ids = content_model.product_ids[:tfidf.shape[0]]
+        
+        to_content = np.array(
+            [content_index.get(pid, -1) for pid in matrix_product_ids], dtype=np.int64
+        )
+        to_content[to_content >= tfidf.shape[0]] = -1
+        seen = histories.tocoo()
+        liked = to_content[seen.col] >= 0
+        liked_matrix = sparse.csr_matrix(
+            (np.ones(liked.sum()), (seen.row[liked], to_content[seen.col][liked])),
+            shape=(len(rows), tfidf.shape[0])
+        )
+        profiles = sparse.csr_matrix(liked_matrix @ tfidf)
+        norms = np.sqrt(np.asarray(profiles.multiply(profiles).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        content = (sparse.diags(1.0 / norms) @ profiles @ tfidf.T).toarray()  # chunk x content rows
+        
+        # combine both in one product id space
+        all_ids = list(content_product_ids)
+        position = {pid: idx for idx, pid in enumerate(all_ids)}
+        for pid in matrix_product_ids:
+            if pid not in position:
+                position[pid] = len(all_ids)
+                all_ids.append(pid)
+        
+        matrix_cols = np.array([position[pid] for pid in matrix_product_ids], dtype=np.int64)
+        collab_part = np.zeros((len(rows), len(all_ids)))
+        collab_part[:, matrix_cols] = collab
+        content_part = np.zeros((len(rows), len(all_ids)))
+        content_part[:, :content.shape[1]] = content
+        
+        # skip products the user already has
+        collab_part[seen.row, matrix_cols[seen.col]] = 0.0
+        content_part[seen.row, matrix_cols[seen.col]] = 0.0
+        scores = 0.6 * collab_part + 0.4 * content_part
+        
+        ranked = {}
+        for i, uid in enumerate(user_ids):
+            recs = []
+            for idx in engine._top_k_indices(scores[i], n):
+                sources = [
+                    name for name, part in (('collaborative', collab_part), ('content', content_part))
+                    if part[i, idx] > 0
+                ]
+                recs.append({
+                    'product_id': all_ids[idx],
+                    'score': float(scores[i, idx]),
+                    'source': '+'.join(sources)
+                })
+            ranked[uid] = recs
+        
+        return ranked
+    
+    def _item_knn(
+        self,
+        user_ids: List[int],
+        rows: np.ndarray,
+        matrix: sparse.csr_matrix,
+        n: int
+    ) -> Dict[int, List[Dict]]:
+        """Histories x sparse neighbour matrix in one product"""
+        engine = self.engine
+        if engine.item_knn.table is None:
+            engine.item_knn.build(engine.interaction_matrix)
+        table = engine.item_knn.table
+        
+        to_table = np.array(
+            [table.index.get(pid, -1) for pid in engine.interaction_matrix.product_ids[:matrix.shape[1]]],
+            dtype=np.int64
+        )
+        seen = sparse.csr_matrix(matrix[rows]).tocoo()
+        known = to_table[seen.col] >= 0
+        histories = sparse.csr_matrix(
+            (seen.data[known], (seen.row[known], to_table[seen.col][known])),
+            shape=(len(rows), len(table.ids))
+        )
+        
+        scores = (histories @ table.as_matrix()).toarray()
+        scores[seen.row[known], to_table[seen.col][known]] = 0.0
+        
+        return {
+            uid: [
+                {'product_id': int(table.ids[idx]), 'score': float(scores[i, idx]), 'source': 'item_knn'}
+                for idx in engine._top_k_indices(scores[i], n)
+            ]
+            for i, uid in enumerate(user_ids)
+        }
+    
+    def _als(
+        self,
+        user_ids: List[int],
+        rows: np.ndarray,
+        matrix: sparse.csr_matrix,
+        n: int
+    ) -> Dict[int, List[Dict]]:
+        """One dense (chunk x factors) @ (factors x items) BLAS product"""
+        engine = self.engine
+        model = engine.als
+        model.ensure_trained(engine.interaction_matrix)
+        
+        product_ids = engine.interaction_matrix.product_ids
+        histories = []
+        for row in rows:
+            lo, hi = matrix.indptr[row], matrix.indptr[row + 1]
+            histories.append({
+                product_ids[col]: float(weight)
+                for col, weight in zip(matrix.indices[lo:hi], matrix.data[lo:hi])
+            })
+        
+        vectors = [model.user_vector(uid, history) for uid, history in zip(user_ids, histories)]
+        scored = [i for i, vector in enumerate(vectors) if vector is not None]
+        if not scored:
+            return {}
+        
+        scores = np.vstack([vectors[i] for i in scored]) @ model.item_factors.T
+        
+        ranked = {}
+        for block_row, i in enumerate(scored):
+            excluded = [model.product_index[pid] for pid in histories[i] if pid in model.product_index]
+            user_scores = scores[block_row]
+            user_scores[excluded] = -np.inf
+            
+            top_n = min(n, user_scores.size - len(excluded))
+            if top_n <= 0:
+                ranked[user_ids[i]] = []
+                continue
+            
+            top = np.argpartition(-user_scores, top_n - 1)[:top_n]
+            top = top[np.argsort(-user_scores[top], kind='stable')]
+            ranked[user_ids[i]] = [
+                {'product_id': int(model.product_ids[idx]), 'score': float(user_scores[idx]), 'source': 'als'}
+                for idx in top
+            ]
+        
+        return ranked
@@ -0,0 +1,184 @@
+import copy
+import time
+import threading
+from itertools import groupby
+from contextlib import contextmanager, ExitStack
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy.orm import Session
+
+from app.models.user import User
+from app.models.product import Product
+from app.models.interaction import Interaction
+
+RECENT_PURCHASES = 5
+FAVORITE_TAGS = 5
+
+# striped locks so concurrent writes for one user cannot lose each other's update
+_locks = [threading.Lock() for _ in range(64)]
+
+# keys the explainer reads as its user context
+CONTEXT_KEYS = (
+    'interaction_count', 'purchase_count', 'recent_purchases', 'top_categories',
+    'avg_purchase_price', 'engagement_level', 'favorite_tags'
+)
+
+
+def empty_profile() -> Dict:
+    """Profile of a user with no interactions yet"""
+    return {
+        'interaction_count': 0,
+        'purchase_count': 0,
+        'category_counts': {},
+        'tag_counts': {},
+        'recent_purchases': [],
+        'top_categories': [],
+        'avg_purchase_price': 0,
+        'engagement_level': 'New User',
+        'favorite_tags': []
+    }
+
+
+def profile_lock(user_id: int) -> threading.Lock:
+    """Lock to hold from reading a user's profile until the updated one is committed"""
+    return _locks[user_id % len(_locks)]
+
+
+@contextmanager
+def profile_locks(user_ids: Iterable[int]) -> Iterator[None]:
+    """Hold several users' locks at once (always taken in the same order, so writers cannot deadlock)"""
+    with ExitStack() as stack:
+        for index in sorted({user_id % len(_locks) for user_id in user_ids}):
+            stack.enter_context(_locks[index])
+        yield
+
+
+def apply_interactions(profile: Optional[Dict], rows: Iterable) -> Dict:
+    """
+    Fold a user's new (interaction_type, product) pairs, oldest first, into a copy of their profile
+    
+    Only the user's own counters are touched, so the cost does not grow with their
+    history. A new dict is returned so SQLAlchemy sees the JSON column change.
+    """
+    profile = copy.deepcopy(profile) if profile else empty_profile()
+    for interaction_type, product in rows:
+        _count(profile, interaction_type, product)
+    _derive(profile)
+    return profile
+
+
+def profile_context(profile: Optional[Dict]) -> Dict:
+    """The explainer's behavioral context, read straight off the stored profile"""
+    profile = profile or empty_profile()
+    return {key: profile[key] for key in CONTEXT_KEYS}
+
+
+def build_profile(rows: Iterable) -> Dict:
+    """Profile from a user's (interaction_type, product) pairs, oldest first"""
+    profile = empty_profile()
+    for interaction_type, product in rows:
+        _count(profile, interaction_type, product)
+    _derive(profile)
+    return profile
+
+
+def history_profile(db: Session, user_id: int) -> Dict:
+    """Profile built from the user's stored interactions (not saved)"""
+    # the id keeps repeated (type, product) rows from being de-duplicated by the ORM
+    rows = db.query(Interaction.id, Interaction.interaction_type, Product).outerjoin(
+        Product, Product.id == Interaction.product_id
+    ).filter(
+        Interaction.user_id == user_id
+    ).order_by(Interaction.timestamp, Interaction.id).all()
+    
+    return build_profile((row[1], row[2]) for row in rows)
+
+
+def load_profile(db: Session, user: User) -> Dict:
+    """Stored profile, built from the user's interactions (and saved) if it was never materialized"""
+    if user.behavioral_profile:
+        return user.behavioral_profile
+    
+    # a writer may have saved one since the user was read; never overwrite it with an older build
+    with profile_lock(user.id):
+        db.refresh(user, ['behavioral_profile'])
+        if not user.behavioral_profile:
+            user.behavioral_profile = history_profile(db, user.id)
+            db.commit()
+    return user.behavioral_profile
+
+
+def rebuild_profiles(db: Session, batch_size: int = 1000) -> int:
+    """Recompute every user's profile from the interactions table; returns the number of users"""
+    start = time.perf_counter()
+    
+    profiles = {user_id: empty_profile() for (user_id,) in db.query(User.id)}
+    
+    rows = db.query(Interaction.user_id, Interaction.interaction_type, Product, Interaction.id).outerjoin(
+        Product, Product.id == Interaction.product_id
+    ).order_by(Interaction.user_id, Interaction.timestamp, Interaction.id).yield_per(batch_size)
+    
+    for user_id, user_rows in groupby(rows, key=lambda row: row[0]):
+        if user_id in profiles:
+            profiles[user_id] = build_profile((row[1], row[2]) for row in user_rows)
+    
+    updates = [{'id': user_id, 'behavioral_profile': profile} for user_id, profile in profiles.items()]
+    for i in range(0, len(updates), batch_size):
+        db.bulk_update_mappings(User, updates[i:i + batch_size])
+    db.commit()
+    
+    print(f"✅ Rebuilt {len(profiles)} behavioral profiles in {time.perf_counter() - start:.1f}s")
+    return len(profiles)
+
+
+def _count(profile: Dict, interaction_type: str, product: Optional[Product]) -> None:
+    """Add one interaction to the raw counters in place"""
+    profile['interaction_count'] += 1
+    if interaction_type == 'purchase':
+        profile['purchase_count'] += 1
+    
+    # interactions with a missing product only count towards the totals
+    if product is not None:
+        categories = profile['category_counts']
+        categories[product.category] = categories.get(product.category, 0) + 1
+        
+        tags = profile['tag_counts']
+        for tag in product.tags or []:
+            tags[tag] = tags.get(tag, 0) + 1
+        
+        if interaction_type == 'purchase':
+            profile['recent_purchases'] = [
+                {'name': product.name, 'price': product.price, 'category': product.category}
+            ] + profile['recent_purchases'][:RECENT_PURCHASES - 1]
+
+
+def _derive(profile: Dict) -> None:
+    """Refresh the summary fields from the raw counters"""
+    interaction_count = profile['interaction_count']
+    
+    # ties go to the alphabetically first category / tag so rebuilds are stable
+    profile['top_categories'] = [
+        {
+            'category': category,
+            'count': count,
+            'percentage': (count / interaction_count) * 100
+        }
+        for category, count in sorted(profile['category_counts'].items(), key=lambda x: (-x[1], x[0]))
+    ]
+    
+    profile['favorite_tags'] = [
+        tag for tag, _ in sorted(profile['tag_counts'].items(), key=lambda x: (-x[1], x[0]))[:FAVORITE_TAGS]
+    ]
+    
+    prices: List[float] = [p['price'] for p in profile['recent_purchases']]
+    profile['avg_purchase_price'] = sum(prices) / len(prices) if prices else 0
+    
+    if interaction_count == 0:
+        profile['engagement_level'] = 'New User'
+    elif interaction_count < 5:
+        profile['engagement_level'] = 'New Explorer'
+    elif interaction_count < 15:
+        profile['engagement_level'] = 'Regular Browser'
+    elif profile['purchase_count'] > 5:
+        profile['engagement_level'] = 'Loyal Customer'
+    else:
+        profile['engagement_level'] = 'Active Shopper'
\ No newline at end of file
@@ -0,0 +1,118 @@
+import time
+import itertools
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend while its circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a rolling window of recent calls
+    
+    A call counts as failed if it raised or took longer than slow_call_seconds.
+    Once the window holds min_calls and the failure rate reaches failure_rate,
+    the circuit opens and calls are rejected for open_seconds. Then a single
+    probe is let through (half-open): success closes the circuit, failure
+    re-opens it. allow() hands out a token per call so that only the probe's
+    own outcome decides; calls allowed before the circuit opened do not.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(
+        self,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 8.0,
+        open_seconds: float = 30.0
+    ):
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        
+        self.state = self.CLOSED
+        self._window = deque(maxlen=window_size)  # True = failed call
+        self._opened_at = 0.0
+        self._tokens = itertools.count(1)
+        self._probe: Optional[int] = None  # token of the half-open probe in flight
+        self._lock = threading.Lock()
+        
+        # metrics
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+    
+    def allow(self) -> Optional[int]:
+        """Token for a call that may go to the backend now (pass it to record()), or None if rejected"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+            
+            if self.state == self.CLOSED:
+                return next(self._tokens)
+            
+            if self.state == self.HALF_OPEN and self._probe is None:
+                self._probe = next(self._tokens)
+                return self._probe
+            
+            self.rejected += 1
+            return None
+    
+    def record(self, token: int, success: bool, duration: float) -> None:
+        """Outcome of an allowed call"""
+        slow = duration > self.slow_call_seconds
+        failed = not success or slow
+        
+        with self._lock:
+            self.calls += 1
+            self.failures += not success
+            self.slow_calls += slow
+            
+            if token == self._probe:
+                self._probe = None
+                if failed:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._window.clear()
+                return
+            
+            if self.state != self.CLOSED:
+                # a call allowed before the circuit opened; only the probe decides now
+                return
+            
+            self._window.append(failed)
+            if (
+                len(self._window) >= self.min_calls
+                and sum(self._window) / len(self._window) >= self.failure_rate
+            ):
+                self._open()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "window_failure_rate": round(sum(self._window) / len(self._window), 4) if self._window else 0.0,
+                "calls": self.calls,
+                "failures": self.failures,
+                "slow_calls": self.slow_calls,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened
+            }
+    
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+        self.times_opened += 1
\ No newline at end of file
@@ -0,0 +1,175 @@
+import os
+import threading
+import numpy as np
+from scipy import sparse
+from typing import Dict, Iterable, List, Optional, Tuple
+from functools import lru_cache
+from sqlalchemy.orm import Session
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.models.product import Product
+from app.services.neighbours import NeighbourTable
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class ContentModel:
+    """
+    Shared TF-IDF content model
+    Holds the fitted vectorizer, the L2-normalized product x term matrix and product id -> row
+    """
+    
+    def __init__(self, max_features: int = 100, refit_ratio: float = 0.2):
+        self.max_features = max_features
+        self.refit_ratio = refit_ratio  # refit once this share of rows was added incrementally
+        self.vectorizer: Optional[TfidfVectorizer] = None
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self.product_ids: List[int] = []
+        self.product_index: Dict[int, int] = {}
+        self.version = 0
+        
+        self._texts: List[str] = []
+        self._extended = 0
+        self._lock = threading.RLock()
+    
+    @property
+    def is_built(self) -> bool:
+        return self.vectorizer is not None
+    
+    @staticmethod
+    def product_text(name: str, category: str, tags: Optional[List[str]]) -> str:
+        """Combine text features of a product"""
+        return f"{name} {category} {' '.join(tags or [])}"
+    
+    def build(self, db: Session) -> None:
+        """Fit the vectorizer over the whole catalog"""
+        rows = db.query(Product.id, Product.name, Product.category, Product.tags).all()
+        
+        with self._lock:
+            self.product_ids = [r.id for r in rows]
+            self._texts = [self.product_text(r.name, r.category, r.tags) for r in rows]
+            self._fit()
+    
+    def ensure_built(self, db: Session) -> None:
+        """Build lazily when used outside the app lifespan (scripts, shells)"""
+        if not self.is_built:
+            self.build(db)
+    
+    def add_product(self, product: Product) -> None:
+        """Append a new product using the current vocabulary; refit when drift gets large"""
+        with self._lock:
+            if not self.is_built or product.id in self.product_index:
+                return
+            
+            text = self.product_text(product.name, product.category, product.tags)
+            self.product_ids.append(product.id)
+            self._texts.append(text)
+            
+            self._extended += 1
+            if self._extended > self.refit_ratio * len(self.product_ids):
+                self._fit()
+                return
+            
+            row = self.vectorizer.transform([text])
+            self.matrix = sparse.vstack([self.matrix, row], format='csr')
+            self.product_index[product.id] = len(self.product_ids) - 1
+            self.version += 1
+    
+    def score(self, liked_product_ids: Iterable[int]) -> np.ndarray:
+        """
+        Cosine similarity of every product to the mean profile of the liked products
+        One sparse mat-vec; rows are already unit length
+        """
+        with self._lock:
+            matrix, product_index = self.matrix, self.product_index
+        rows = sorted({
+            product_index[pid] for pid in liked_product_ids
+            if product_index.get(pid, matrix.shape[0]) < matrix.shape[0]
+        })
+        
+        if not rows:
+            return np.zeros(matrix.shape[0])
+        
+        profile = np.asarray(matrix[rows].mean(axis=0)).ravel()
+        norm = np.linalg.norm(profile)
+        if norm == 0:
+            return np.zeros(matrix.shape[0])
+        
+        return matrix @ (profile / norm)
+    
+    def _fit(self) -> None:
+        if not self._texts:
+            return
+        
+        # default TfidfVectorizer norm='l2' gives unit-length rows
+        vectorizer = TfidfVectorizer(stop_words='english', max_features=self.max_features)
+        matrix = sparse.csr_matrix(vectorizer.fit_transform(self._texts))
+        
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.product_index = {pid: idx for idx, pid in enumerate(self.product_ids)}
+        self._extended = 0
+        self.version += 1
+
+
+class ContentSimilarityIndex:
+    """
+    Precomputed "more like this" index
+    Top-K content neighbours per product, built offline from the TF-IDF matrix
+    """
+    
+    def __init__(self, content_model: ContentModel, k: int, path: str):
+        self.content_model = content_model
+        self.k = k
+        self.path = path
+        self.table: Optional[NeighbourTable] = None
+    
+    def build(self) -> None:
+        """Compute top-K cosine neighbours for every product"""
+        with self.content_model._lock:
+            matrix = self.content_model.matrix
+            product_ids = self.content_model.product_ids[:matrix.shape[0]]
+        
+        self.table = NeighbourTable.from_vectors(product_ids, matrix, self.k)
+    
+    def save(self) -> None:
+        if self.table is not None:
+            self.table.save(self.path)
+    
+    def load(self) -> bool:
+        """Load the persisted index; returns False if none has been built yet"""
+        self.table = NeighbourTable.load(self.path)
+        return self.table is not None
+    
+    def similar(self, product_id: int, n: int = 10) -> List[Tuple[int, float]]:
+        """(product_id, score) pairs most similar to a product, best first"""
+        if self.table is not None and product_id in self.table.index:
+            return self.table.neighbours_of(product_id, n)
+        
+        # product added after the last build: one mat-vec against the live model
+        similarities = self.content_model.score([product_id])
+        product_ids = self.content_model.product_ids
+        candidates = [idx for idx in np.argsort(-similarities)[:n + 1] if similarities[idx] > 0]
+        
+        return [
+            (product_ids[idx], float(similarities[idx]))
+            for idx in candidates
+            if product_ids[idx] != product_id
+        ][:n]
+
+
+@lru_cache()
+def get_content_model() -> ContentModel:
+    """Get the shared content model instance"""
+    return ContentModel()
+
+
+@lru_cache()
+def get_content_similarity_index() -> ContentSimilarityIndex:
+    """Get the shared content similarity index instance"""
+    return ContentSimilarityIndex(
+        get_content_model(),
+        k=settings.CONTENT_SIMILAR_NEIGHBOURS,
+        path=os.path.join(settings.MODEL_DIR, 'content_similar.npz')
+    )
@@ -0,0 +1,174 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from functools import lru_cache
+from sqlalchemy import bindparam, insert, update
+
+from app.database import SessionLocal
+from app.models.explanation_cache import CachedExplanation
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ExplanationCache:
+    """
+    Two-tier cache of generated explanations
+    
+    An in-memory LRU sits in front of the explanation_cache table, so repeat views
+    skip both the LLM and the database. Entries expire after ttl_seconds; the table
+    is trimmed to max_entries (least recently used first) every evict_every writes.
+    Reads and writes take a list of keys, so a whole batch costs one query each;
+    last_used updates from table hits are deferred and written in batches.
+    """
+    
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        memory_entries: int = 2000,
+        evict_every: int = 100
+    ):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.evict_every = evict_every
+        
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created_at, explanation)
+        self._writes = 0
+        self._touched: Dict[str, datetime] = {}  # key -> last table hit, not yet written
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(fingerprint: str, product_id: int, personality: str, model: str, prompt_version: str) -> str:
+        """Stable hash of everything that changes the generated text"""
+        payload = json.dumps([fingerprint, product_id, personality, model, prompt_version])
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+    
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Cached explanations by key (hits only); memory misses are read with one IN query"""
+        now = _utcnow()
+        found, missing = {}, []
+        
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is not None and now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    found[key] = entry[1]
+                    continue
+                if entry is not None:
+                    del self._memory[key]
+                missing.append(key)
+        
+        if not missing:
+            return found
+        
+        db = SessionLocal()
+        try:
+            rows = db.query(CachedExplanation).filter(CachedExplanation.key.in_(set(missing))).all()
+            for row in rows:
+                if now - row.created_at > self.ttl:
+                    continue
+                found[row.key] = row.explanation
+                self._remember(row.key, row.created_at, row.explanation)
+            
+            # last_used only orders eviction: record the hits and write them with the next batch
+            with self._lock:
+                self._touched.update((row.key, now) for row in rows if row.key in found)
+                write = len(self._touched) >= self.evict_every
+            if write:
+                self._write_touched(db)
+                db.commit()
+            return found
+        finally:
+            db.close()
+    
+    def set(self, key: str, explanation: str) -> None:
+        self.set_many({key: explanation})
+    
+    def set_many(self, explanations: Dict[str, str]) -> None:
+        """Store explanations in one transaction (plus any deferred last_used updates)"""
+        if not explanations:
+            return
+        now = _utcnow()
+        for key, explanation in explanations.items():
+            self._remember(key, now, explanation)
+        
+        db = SessionLocal()
+        try:
+            self._write_touched(db)
+            db.query(CachedExplanation).filter(
+                CachedExplanation.key.in_(list(explanations))
+            ).delete(synchronize_session=False)
+            db.execute(insert(CachedExplanation), [
+                {"key": key, "explanation": explanation, "created_at": now, "last_used": now}
+                for key, explanation in explanations.items()
+            ])
+            
+            with self._lock:
+                self._writes += len(explanations)
+                evict = self._writes >= self.evict_every
+                if evict:
+                    self._writes = 0
+            if evict:
+                self._evict(db, now)
+            
+            db.commit()
+        finally:
+            db.close()
+    
+    def _write_touched(self, db) -> None:
+        """Stage the deferred last_used updates as one executemany"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        
+        table = CachedExplanation.__table__
+        db.execute(
+            update(table).where(table.c.key == bindparam("touched_key")).values(last_used=bindparam("touched_at")),
+            [{"touched_key": key, "touched_at": moment} for key, moment in touched.items()]
+        )
+    
+    def _remember(self, key: str, created_at: datetime, explanation: str) -> None:
+        with self._lock:
+            self._memory[key] = (created_at, explanation)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+    
+    def _evict(self, db, now: datetime) -> None:
+        """Drop expired rows, then the least recently used rows over max_entries"""
+        db.query(CachedExplanation).filter(
+            CachedExplanation.created_at < now - self.ttl
+        ).delete(synchronize_session=False)
+        
+        overflow = db.query(CachedExplanation).count() - self.max_entries
+        if overflow > 0:
+            oldest = db.query(CachedExplanation.key).order_by(
+                CachedExplanation.last_used
+            ).limit(overflow).subquery()
+            db.query(CachedExplanation).filter(
+                CachedExplanation.key.in_(oldest.select())
+            ).delete(synchronize_session=False)
+
+
+@lru_cache()
+def get_explanation_cache() -> ExplanationCache:
+    """Get the shared explanation cache instance"""
+    return ExplanationCache(
+        ttl_seconds=settings.EXPLANATION_CACHE_TTL_SECONDS,
+        max_entries=settings.EXPLANATION_CACHE_MAX_ENTRIES,
+        memory_entries=settings.EXPLANATION_CACHE_MEMORY_ENTRIES
+    )
\ No newline at end of file
@@ -0,0 +1,198 @@
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models.user import User
+from app.models.product import Product
+from app.models.interaction import Interaction, InteractionCreate, INTERACTION_WEIGHTS
+from app.services.behavioral_profile import apply_interactions, history_profile, profile_locks
+from app.services.user_stats import record_interactions
+from app.services.popularity import get_popularity_tracker
+from app.services.interaction_matrix import get_interaction_matrix
+from app.services.result_cache import get_recommendation_cache
+
+RowError = Dict  # {"index": position in the request, "error": message}
+
+
+class TooManyRowsError(Exception):
+    """Raised when a bulk body holds more rows than allowed (checked before validation)"""
+
+
+@contextmanager
+def derived_updates(
+    db: Session,
+    interactions: List[InteractionCreate],
+    users: Dict[int, User],
+    products: Dict[int, Product],
+    timestamps: Optional[List[datetime]] = None
+) -> Iterator[List[int]]:
+    """
+    Keep every model derived from interactions in step with one written batch
+    
+    Wrap the insert and commit, adding the new interaction ids to the yielded list.
+    Profiles and category rollups are staged into the same transaction, under the
+    affected users' locks; popularity counters, the in-memory matrix and cached
+    rankings are updated once the block has committed.
+    
+    timestamps: when each interaction happened, if it was not just now
+    """
+    inserted_ids: List[int] = []
+    
+    by_user = defaultdict(list)
+    for interaction in interactions:
+        by_user[interaction.user_id].append((interaction.interaction_type, products[interaction.product_id]))
+    
+    # requests run on worker threads, so re-read the profiles under the users' locks
+    with profile_locks(by_user):
+        db.query(User).filter(User.id.in_(list(by_user))).populate_existing().all()
+        for user_id, rows in by_user.items():
+            user = users[user_id]
+            user.behavioral_profile = apply_interactions(
+                user.behavioral_profile or history_profile(db, user_id),
+                rows
+            )
+        record_interactions(db, by_user)
+        
+        yield inserted_ids
+    
+    # only committed rows are counted; dirty counters are persisted in batches
+    popularity = get_popularity_tracker()
+    popularity.record_many([
+        (interaction.product_id, INTERACTION_WEIGHTS.get(interaction.interaction_type, 1.0), timestamp)
+        for interaction, timestamp in zip(interactions, timestamps or [None] * len(interactions))
+    ], last_id=max(inserted_ids, default=None))
+    if popularity.should_flush():
+        popularity.flush(db)
+    
+    # keep the shared user-item matrix current
+    get_interaction_matrix().add_many([
+        (interaction.user_id, interaction.product_id, interaction.interaction_type)
+        for interaction in interactions
+    ])
+    
+    cache = get_recommendation_cache()
+    for user_id in by_user:
+        cache.invalidate_user(user_id)
+
+
+def validation_message(error: ValidationError) -> str:
+    """'field: message' for the first problem of a failed validation"""
+    first = error.errors()[0]
+    field = ".".join(str(part) for part in first['loc'])
+    return f"{field}: {first['msg']}" if field else first['msg']
+
+
+def parse_rows(
+    body: bytes,
+    ndjson: bool,
+    max_rows: Optional[int] = None
+) -> Tuple[List[Tuple[int, InteractionCreate]], List[RowError]]:
+    """
+    (index, interaction) pairs from a JSON array or NDJSON body, plus the rows that did not parse
+    
+    Raises TooManyRowsError past max_rows, counted before any row is decoded (NDJSON)
+    or validated (JSON array).
+    """
+    if ndjson:
+        lines = [(index, line) for index, line in enumerate(body.decode().splitlines()) if line.strip()]
+        if max_rows is not None and len(lines) > max_rows:
+            raise TooManyRowsError(len(lines))
+        
+        items = []
+        for index, line in lines:
+            try:
+                items.append((index, json.loads(line)))
+            except ValueError as e:
+                items.append((index, e))
+    else:
+        data = json.loads(body)
+        if not isinstance(data, list):
+            raise ValueError("expected a JSON array of interactions")
+        if max_rows is not None and len(data) > max_rows:
+            raise TooManyRowsError(len(data))
+        items = list(enumerate(data))
+    
+    rows, errors = [], []
+    for index, item in items:
+        if isinstance(item, Exception):
+            errors.append({"index": index, "error": f"invalid JSON: {item}"})
+            continue
+        try:
+            rows.append((index, InteractionCreate.model_validate(item)))
+        except ValidationError as e:
+            errors.append({"index": index, "error": validation_message(e)})
+    
+    return rows, errors
+
+
+def ingest(
+    db: Session,
+    rows: List[Tuple[int, InteractionCreate]],
+    batch_size: int,
+    timestamps: Optional[Dict[int, datetime]] = None
+) -> Tuple[int, List[RowError]]:
+    """
+    Write validated interactions a batch at a time; returns (inserted, errors)
+    
+    Each batch checks its user and product ids with one IN query apiece, inserts
+    the valid rows with a single executemany and commits once. Rows pointing at
+    unknown users or products are reported and skipped. timestamps (by row index)
+    are stored instead of the insert time, e.g. for events queued earlier.
+    """
+    inserted, errors = 0, []
+    
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        
+        user_ids = {interaction.user_id for _, interaction in batch}
+        product_ids = {interaction.product_id for _, interaction in batch}
+        users = {u.id: u for u in db.query(User).filter(User.id.in_(user_ids)).all()}
+        products = {p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids)).all()}
+        
+        valid = []
+        for index, interaction in batch:
+            if interaction.user_id not in users:
+                errors.append({"index": index, "error": "User not found"})
+            elif interaction.product_id not in products:
+                errors.append({"index": index, "error": "Product not found"})
+            else:
+                valid.append((index, interaction))
+        
+        if not valid:
+            continue
+        
+        values = [
+            {
+                **interaction.model_dump(),
+                "weight": INTERACTION_WEIGHTS.get(interaction.interaction_type, 1.0)
+            }
+            for _, interaction in valid
+        ]
+        if timestamps is not None:
+            for value, (index, _) in zip(values, valid):
+                value["timestamp"] = timestamps[index]
+        
+        interactions = [interaction for _, interaction in valid]
+        with derived_updates(db, interactions, users, products, [value.get("timestamp") for value in values]) as inserted_ids:
+            inserted_ids.extend(db.execute(insert(Interaction).returning(Interaction.id), values).scalars())
+            db.commit()
+        
+        inserted += len(valid)
+    
+    return inserted, errors
+
+
+def ingest_body(db: Session, body: bytes, ndjson: bool, batch_size: int, max_rows: int) -> Tuple[int, int, List[RowError]]:
+    """
+    parse_rows() + ingest() for a bulk request body; returns (received, inserted, errors)
+    Blocking (JSON decoding, validation and inserts): run it in the threadpool.
+    """
+    rows, errors = parse_rows(body, ndjson, max_rows)
+    received = len(rows) + len(errors)
+    inserted, write_errors = ingest(db, rows, batch_size)
+    return received, inserted, sorted(errors + write_errors, key=lambda error: error["index"])
\ No newline at end of file
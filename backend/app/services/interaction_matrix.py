@@ -0,0 +1,207 @@
+import time
+import threading
+import numpy as np
+from scipy import sparse
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import defaultdict
+from functools import lru_cache
+from sqlalchemy.orm import Session
+
+from app.models.interaction import Interaction, INTERACTION_WEIGHTS
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class InteractionMatrix:
+    """
+    Process-wide sparse user x item matrix
+    Built once from the interactions table, then kept current by the write path
+    
+    Writes collect in a small pending delta that is folded into the CSR matrix once
+    compact_every cells are pending or the oldest is compact_seconds old, so reads do
+    not rebuild the matrix after every write. Only the changed rows are re-normalized.
+    """
+    
+    def __init__(self, weights: Dict[str, float], compact_every: int = 1000, compact_seconds: float = 2.0):
+        self.weights = weights
+        self.compact_every = compact_every
+        self.compact_seconds = compact_seconds
+        self.user_index: Dict[int, int] = {}
+        self.product_index: Dict[int, int] = {}
+        self.user_ids: List[int] = []
+        self.product_ids: List[int] = []
+        self.version = 0
+        self.is_built = False
+        
+        self._matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self._normalized = self._matrix
+        self._inv_norms = np.ones(0, dtype=np.float64)
+        self._pending: Dict[Tuple[int, int], float] = defaultdict(float)
+        self._pending_since: Optional[float] = None
+        self._listeners: List[Callable[[Optional[np.ndarray]], None]] = []
+        self._lock = threading.RLock()
+    
+    def build(self, db: Session) -> None:
+        """Load all interactions in one pass and replace the matrix"""
+        rows = db.query(
+            Interaction.user_id,
+            Interaction.product_id,
+            Interaction.interaction_type
+        ).all()
+        
+        with self._lock:
+            self.user_index, self.user_ids = {}, []
+            self.product_index, self.product_ids = {}, []
+            
+            row_idx = np.fromiter((self._row(r.user_id) for r in rows), dtype=np.int64, count=len(rows))
+            col_idx = np.fromiter((self._col(r.product_id) for r in rows), dtype=np.int64, count=len(rows))
+            values = np.fromiter(
+                (self.weights.get(r.interaction_type, 1.0) for r in rows),
+                dtype=np.float64,
+                count=len(rows)
+            )
+            
+            # duplicate (user, product) pairs are summed by the constructor
+            self._matrix = sparse.csr_matrix(
+                (values, (row_idx, col_idx)),
+                shape=(len(self.user_ids), len(self.product_ids))
+            )
+            self._pending.clear()
+            self._pending_since = None
+            self._inv_norms = np.ones(self._matrix.shape[0], dtype=np.float64)
+            self._normalize(np.arange(self._matrix.shape[0]))
+            self.version += 1
+            self.is_built = True
+            
+            for listener in self._listeners:
+                listener(None)
+    
+    def add_listener(self, listener: Callable[[Optional[np.ndarray]], None]) -> None:
+        """
+        Register a callback for matrix changes
+        Called with the changed row indices, or None after a full rebuild
+        """
+        self._listeners.append(listener)
+    
+    def ensure_built(self, db: Session) -> None:
+        """Build lazily when used outside the app lifespan (scripts, shells)"""
+        if not self.is_built:
+            self.build(db)
+    
+    def add_many(self, rows: List[Tuple[int, int, str]]) -> None:
+        """Record a batch of (user_id, product_id, interaction_type) under one lock"""
+        with self._lock:
+            if rows and not self._pending:
+                self._pending_since = time.monotonic()
+            for user_id, product_id, interaction_type in rows:
+                key = (self._row(user_id), self._col(product_id))
+                self._pending[key] += self.weights.get(interaction_type, 1.0)
+    
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """Current CSR snapshot (up to one compaction behind the write path); callers must treat it as read-only"""
+        with self._lock:
+            if self._pending and (
+                len(self._pending) >= self.compact_every
+                or time.monotonic() - self._pending_since >= self.compact_seconds
+            ):
+                self._compact()
+            return self._matrix
+    
+    def snapshot(self) -> Tuple[sparse.csr_matrix, sparse.csr_matrix, int]:
+        """Consistent (raw, row L2-normalized, version) of the current matrix"""
+        with self._lock:
+            return self.matrix, self._normalized, self.version
+    
+    def compact(self) -> None:
+        """Fold every pending write in now (scripts and checks that need an exact matrix)"""
+        with self._lock:
+            if self._pending:
+                self._compact()
+    
+    def user_row(self, user_id: int) -> Optional[int]:
+        """Row index for a user, or None if they have no interactions"""
+        return self.user_index.get(user_id)
+    
+    def product_column(self, product_id: int) -> Optional[int]:
+        """Column index for a product, or None if nobody interacted with it"""
+        return self.product_index.get(product_id)
+    
+    def _row(self, user_id: int) -> int:
+        idx = self.user_index.get(user_id)
+        if idx is None:
+            idx = len(self.user_ids)
+            self.user_index[user_id] = idx
+            self.user_ids.append(user_id)
+        return idx
+    
+    def _col(self, product_id: int) -> int:
+        idx = self.product_index.get(product_id)
+        if idx is None:
+            idx = len(self.product_ids)
+            self.product_index[product_id] = idx
+            self.product_ids.append(product_id)
+        return idx
+    
+    def _compact(self) -> None:
+        """Fold pending writes into a fresh CSR matrix (old snapshots stay valid)"""
+        shape = (len(self.user_ids), len(self.product_ids))
+        keys = list(self._pending.keys())
+        delta = sparse.csr_matrix(
+            (
+                np.fromiter(self._pending.values(), dtype=np.float64, count=len(keys)),
+                (
+                    np.fromiter((k[0] for k in keys), dtype=np.int64, count=len(keys)),
+                    np.fromiter((k[1] for k in keys), dtype=np.int64, count=len(keys))
+                )
+            ),
+            shape=shape
+        )
+        
+        base = self._matrix
+        if base.shape != shape:
+            # grow without copying: pad indptr for new rows, widen for new columns
+            indptr = np.concatenate([
+                base.indptr,
+                np.full(shape[0] - base.shape[0], base.indptr[-1], dtype=base.indptr.dtype)
+            ])
+            base = sparse.csr_matrix((base.data, base.indices, indptr), shape=shape)
+        
+        self._matrix = (base + delta).tocsr()
+        self._pending.clear()
+        self._pending_since = None
+        
+        changed_rows = np.unique(delta.nonzero()[0])
+        if self._inv_norms.size < shape[0]:
+            self._inv_norms = np.concatenate([self._inv_norms, np.ones(shape[0] - self._inv_norms.size)])
+        self._normalize(changed_rows)
+        self.version += 1
+        
+        for listener in self._listeners:
+            listener(changed_rows)
+    
+    def _normalize(self, rows: np.ndarray) -> None:
+        """Recompute the L2 norms of the given rows and rescale the matrix with the stored norms"""
+        if rows.size:
+            changed = self._matrix[rows]
+            norms = np.sqrt(np.asarray(changed.multiply(changed).sum(axis=1)).ravel())
+            norms[norms == 0] = 1.0
+            self._inv_norms[rows] = 1.0 / norms
+        
+        # same structure as the matrix, only the values are scaled (no sparse product)
+        matrix = self._matrix
+        self._normalized = sparse.csr_matrix(
+            (matrix.data * np.repeat(self._inv_norms, np.diff(matrix.indptr)), matrix.indices, matrix.indptr),
+            shape=matrix.shape
+        )
+
+
+@lru_cache()
+def get_interaction_matrix() -> InteractionMatrix:
+    """Get the shared interaction matrix instance"""
+    return InteractionMatrix(
+        INTERACTION_WEIGHTS,
+        compact_every=settings.MATRIX_COMPACT_EVERY,
+        compact_seconds=settings.MATRIX_COMPACT_SECONDS
+    )
@@ -0,0 +1,87 @@
+import os
+import numpy as np
+from scipy import sparse
+from typing import Dict, Optional
+from functools import lru_cache
+
+from app.services.interaction_matrix import InteractionMatrix
+from app.services.neighbours import NeighbourTable
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class ItemKNNModel:
+    """
+    Item-item collaborative filtering
+    Offline: top-K similar products per product from the interaction matrix
+    Online: sum the neighbour lists of the products in a user's history
+    """
+    
+    def __init__(self, k: int, path: str):
+        self.k = k
+        self.path = path
+        self.table: Optional[NeighbourTable] = None
+    
+    def build(self, interaction_matrix: InteractionMatrix) -> None:
+        """Compute the neighbour table from item co-interaction cosine similarity"""
+        matrix = interaction_matrix.matrix
+        items = sparse.csr_matrix(matrix.T)
+        
+        # L2-normalize each item's user vector
+        norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        items = sparse.csr_matrix(sparse.diags(1.0 / norms) @ items)
+        
+        self.table = NeighbourTable.from_vectors(
+            interaction_matrix.product_ids[:items.shape[0]],
+            items,
+            self.k
+        )
+    
+    def save(self) -> None:
+        if self.table is not None:
+            self.table.save(self.path)
+    
+    def load(self) -> bool:
+        """Load the persisted table; returns False if none has been built yet"""
+        self.table = NeighbourTable.load(self.path)
+        return self.table is not None
+    
+    def score(self, history: Dict[int, float]) -> Dict[int, float]:
+        """
+        Score candidate products for a user history {product_id: weight}
+        Cost is O(len(history) * K), independent of the number of users
+        """
+        if self.table is None:
+            return {}
+        
+        positions = [self.table.index[pid] for pid in history if pid in self.table.index]
+        if not positions:
+            return {}
+        
+        weights = np.array(
+            [history[int(self.table.ids[pos])] for pos in positions],
+            dtype=np.float64
+        )
+        neighbours = self.table.neighbours[positions]
+        contributions = self.table.scores[positions] * weights[:, None]
+        
+        valid = neighbours >= 0
+        cols, totals = np.unique(neighbours[valid], return_inverse=True)
+        summed = np.bincount(totals, weights=contributions[valid])
+        
+        return {
+            int(self.table.ids[col]): float(score)
+            for col, score in zip(cols, summed)
+            if int(self.table.ids[col]) not in history
+        }
+
+
+@lru_cache()
+def get_item_knn_model() -> ItemKNNModel:
+    """Get the shared item-item model instance"""
+    return ItemKNNModel(
+        k=settings.ITEM_KNN_NEIGHBOURS,
+        path=os.path.join(settings.MODEL_DIR, 'item_knn.npz')
+    )
@@ -0,0 +1,113 @@
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+import google.generativeai as genai
+
+
+class LLMBackend(ABC):
+    """
+    Blocking text-generation backend used by LLMClient (which runs it on the LLM pool)
+    Select one with the LLM_BACKEND setting
+    """
+    
+    name = 'base'
+    
+    @abstractmethod
+    def generate(self, prompt: str, max_tokens: int, temperature: float) -> str:
+        """One completion (blocking)"""
+    
+    def warm_up(self) -> None:
+        """Optional connection setup at startup"""
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the google-generativeai SDK"""
+    
+    name = 'gemini'
+    
+    def __init__(self, api_key: str, model_name: str):
+        genai.configure(api_key=api_key)
+        self.api_key = api_key
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+    
+    def generate(self, prompt: str, max_tokens: int, temperature: float) -> str:
+        response = self.model.generate_content(
+            prompt,
+            generation_config={
+                "temperature": temperature,
+                "max_output_tokens": max_tokens,
+            }
+        )
+        return response.text.strip()
+    
+    def warm_up(self) -> None:
+        if not self.api_key:
+            raise RuntimeError("GEMINI_API_KEY not set, explanations will use fallbacks")
+        self.model.count_tokens("warm up")
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Local stand-in for load and latency testing without a key or network
+    
+    Latency is log-normal around latency_ms (spread latency_sigma) plus output
+    tokens / tokens_per_second. A share of calls (error_rate) raise. The text is
+    a deterministic function of the prompt, and batched prompts get a valid JSON
+    array, so every explanation mode can be exercised offline.
+    """
+    
+    name = 'fake'
+    
+    PHRASES = (
+        "fits right in with what you have been browsing lately",
+        "is a standout pick at this price and rating",
+        "rounds out your recent purchases nicely",
+        "matches the style you keep coming back to"
+    )
+    
+    def __init__(
+        self,
+        latency_ms: float = 800.0,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        tokens_per_second: float = 100.0,
+        seed: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def generate(self, prompt: str, max_tokens: int, temperature: float) -> str:
+        with self._lock:
+            latency = self.latency_ms / 1000 * math.exp(self._rng.gauss(0.0, self.latency_sigma))
+            failed = self._rng.random() < self.error_rate
+        
+        products = re.findall(r"^\[product_id=(\d+)\] (.+)$", prompt, flags=re.MULTILINE)
+        if products:
+            text = json.dumps([
+                {"product_id": int(pid), "explanation": self._sentence(name, prompt)}
+                for pid, name in products
+            ])
+        else:
+            match = re.search(r"PRODUCT BEING RECOMMENDED:\n- Name: (.+)", prompt)
+            text = self._sentence(match.group(1) if match else "This product", prompt)
+        
+        tokens = min(max_tokens, len(text.split()))
+        time.sleep(latency + tokens / self.tokens_per_second)
+        
+        if failed:
+            raise RuntimeError("fake LLM backend: injected error")
+        return text
+    
+    def _sentence(self, name: str, prompt: str) -> str:
+        digest = int(hashlib.sha256((name + prompt).encode()).hexdigest(), 16)
+        return f"{name} {self.PHRASES[digest % len(self.PHRASES)]}."
\ No newline at end of file
@@ -0,0 +1,92 @@
+import time
+import asyncio
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_backends import LLMBackend, GeminiBackend, FakeLLMBackend
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class LLMClient:
+    """
+    Process-wide LLM client, created once and managed by the app lifespan
+    
+    The backend (and its underlying connection) is set up a single time and reused by
+    every request. Backend calls block, so they run on a dedicated, bounded thread pool
+    instead of the event loop. A circuit breaker rejects calls instantly while the
+    backend is failing or too slow.
+    """
+    
+    def __init__(self, backend: LLMBackend, workers: int):
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self.breaker = CircuitBreaker(
+            window_size=settings.LLM_BREAKER_WINDOW,
+            min_calls=settings.LLM_BREAKER_MIN_CALLS,
+            failure_rate=settings.LLM_BREAKER_FAILURE_RATE,
+            slow_call_seconds=settings.LLM_BREAKER_SLOW_CALL_MS / 1000,
+            open_seconds=settings.LLM_BREAKER_OPEN_SECONDS
+        )
+    
+    async def generate(self, prompt: str, max_tokens: int) -> str:
+        """One completion on the LLM pool; raises CircuitOpenError without calling out while open"""
+        token = self.breaker.allow()
+        if token is None:
+            raise CircuitOpenError("LLM circuit is open")
+        
+        elapsed = [0.0]
+        success = False
+        try:
+            text = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                partial(self._timed_generate, elapsed, prompt, max_tokens)
+            )
+            success = True
+        finally:
+            # also on cancellation, or a cancelled half-open probe would block the breaker for good
+            self.breaker.record(token, success, elapsed[0])
+        return text
+    
+    def _timed_generate(self, elapsed: list, prompt: str, max_tokens: int) -> str:
+        """Backend call timed on the worker thread, so waiting for a free LLM thread is not counted as slow"""
+        start = time.monotonic()
+        try:
+            return self.backend.generate(prompt, max_tokens, settings.EXPLANATION_TEMPERATURE)
+        finally:
+            elapsed[0] = time.monotonic() - start
+    
+    async def warm_up(self, timeout: float = 5.0) -> None:
+        """Open the connection at startup so the first user request does not pay for it"""
+        try:
+            await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(self.executor, self.backend.warm_up),
+                timeout
+            )
+            print(f"🤖 LLM client ready ({self.backend.name})")
+        except Exception as e:
+            print(f"⚠️  LLM warm-up failed: {e}")
+    
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_llm_backend() -> LLMBackend:
+    """Backend selected by LLM_BACKEND ('gemini' or 'fake')"""
+    if settings.LLM_BACKEND == 'fake':
+        return FakeLLMBackend(
+            latency_ms=settings.LLM_FAKE_LATENCY_MS,
+            latency_sigma=settings.LLM_FAKE_LATENCY_SIGMA,
+            error_rate=settings.LLM_FAKE_ERROR_RATE,
+            tokens_per_second=settings.LLM_FAKE_TOKENS_PER_SECOND,
+            seed=settings.LLM_FAKE_SEED
+        )
+    return GeminiBackend(api_key=settings.GEMINI_API_KEY, model_name=settings.LLM_MODEL)
+
+
+@lru_cache()
+def get_llm_client() -> LLMClient:
+    """Get the shared LLM client instance"""
+    return LLMClient(create_llm_backend(), workers=settings.LLM_EXECUTOR_WORKERS)
\ No newline at end of file
@@ -1,18 +1,30 @@
-import google.generativeai as genai
-from typing import Dict, List, Optional
+import re
+import json
+import asyncio
+import hashlib
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.models.product import Product
 from app.models.user import User
-from app.models.interaction import Interaction
+from app.services.explanation_cache import get_explanation_cache
+from app.services.llm_client import get_llm_client
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.behavioral_profile import load_profile, profile_context
 from app.config import get_settings
 
 settings = get_settings()
 
+# late LLM calls left running after their response was sent (kept referenced until done)
+_late_tasks: Set[asyncio.Task] = set()
+
 
 class LLMExplainer:
     """Generate natural language explanations for recommendations"""
     
+    PROMPT_VERSION = 1  # bump when the prompt template changes so cached explanations are regenerated
+    EXPLANATION_MODES = ('individual', 'batched')
+    
     PERSONALITIES = {
         'friendly': {
             'persona': 'You are an enthusiastic shopping friend who genuinely wants them to have the best.',
@@ -34,21 +46,61 @@ class LLMExplainer:
     
     def __init__(self, db: Session):
         self.db = db
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(settings.LLM_MODEL)
+        self.client = get_llm_client()  # shared, configured once at startup
+        self.cache = get_explanation_cache()
     
     async def explain_recommendation(
         self,
         user_id: int,
         product: Dict,
         recommendation_source: str,
-        personality: str = 'friendly'
+        personality: str = 'friendly',
+        context: Optional[Dict] = None
     ) -> str:
-        """Generate explanation for why a product is recommended"""
+        """
+        Generate explanation for why a product is recommended
+        Pass a context from build_context() to reuse it across items
+        """
+        explanation, _ = await self.explain_with_status(
+            user_id, product, recommendation_source, personality, context
+        )
+        return explanation
+    
+    async def explain_with_status(
+        self,
+        user_id: int,
+        product: Dict,
+        recommendation_source: str,
+        personality: str = 'friendly',
+        context: Optional[Dict] = None
+    ) -> Tuple[str, str]:
+        """Explanation plus where it came from ('llm', 'cache' or 'fallback')"""
         
         # get rich user context
-        user = self.db.query(User).filter(User.id == user_id).first()
-        user_context = self._get_rich_user_context(user_id)
+        if context is None:
+            context = await run_in_threadpool(self.build_context, user_id)
+        
+        # same user context, product and prompt -> same explanation
+        cache_key = self._cache_key(context, product['id'], personality)
+        cached = await run_in_threadpool(self.cache.get, cache_key)
+        if cached is not None:
+            return cached, 'cache'
+        
+        explanation, source = await self._generate(product, recommendation_source, personality, context)
+        if source == 'llm':
+            await run_in_threadpool(self.cache.set, cache_key, explanation)
+        return explanation, source
+    
+    async def _generate(
+        self,
+        product: Dict,
+        recommendation_source: str,
+        personality: str,
+        context: Dict
+    ) -> Tuple[str, str]:
+        """One uncached LLM explanation ('llm'), or the fallback text ('fallback')"""
+        user = context['user']
+        user_context = context['user_context']
         
         # build enhanced prompt
         prompt = self._build_enhanced_prompt(
@@ -61,34 +113,36 @@ class LLMExplainer:
         
         # call gemini API
         try:
-            generation_config = {
-                "temperature": settings.EXPLANATION_TEMPERATURE,
-                "max_output_tokens": settings.LLM_MAX_TOKENS,
-            }
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
-            
-            explanation = response.text.strip()
-            return explanation
+            explanation = await self.client.generate(prompt, settings.LLM_MAX_TOKENS)
+            return explanation, 'llm'
             
+        except CircuitOpenError:
+            # API known to be failing: answer instantly without a network call
+            return self._safe_fallback(product, recommendation_source, user_context), 'fallback'
         except Exception as e:
             print(f"LLM Error: {e}")
-            return self._fallback_explanation(product, recommendation_source, user_context)
+            return self._safe_fallback(product, recommendation_source, user_context), 'fallback'
     
-    def _build_enhanced_prompt(
-        self,
-        user: Optional[User],
-        user_context: Dict,
-        product: Dict,
-        source: str,
-        personality: str
-    ) -> str:
-        """Build a rich, contextual prompt for better explanations"""
+    def build_context(self, user_id: int) -> Dict:
+        """User row plus behavioral context, built once per request and shared by every item"""
+        user = self.db.query(User).filter(User.id == user_id).first()
+        user_context = self._get_rich_user_context(user_id, user)
         
-        personality_config = self.PERSONALITIES.get(personality, self.PERSONALITIES['friendly'])
+        # changes whenever anything the prompt says about the user changes
+        fingerprint = hashlib.sha256(json.dumps(
+            {'name': user.name if user else None, 'context': user_context},
+            sort_keys=True,
+            default=str
+        ).encode()).hexdigest()
+        
+        return {
+            'user': user,
+            'user_context': user_context,
+            'fingerprint': fingerprint
+        }
+    
+    def _format_user_profile(self, user: Optional[User], user_context: Dict) -> str:
+        """USER PROFILE lines shared by the single-item and batched prompts"""
         
         # build recent purchases string
         recent_purchases = ""
@@ -109,6 +163,25 @@ class LLMExplainer:
         if user_context['avg_purchase_price'] > 0:
             price_insight = f"Typically purchases items around ${user_context['avg_purchase_price']:.0f}"
         
+        return f"""- Name: {user.name if user else 'This shopper'}
+- Shopping Behavior: {user_context['interaction_count']} interactions, {user_context['purchase_count']} purchases
+- {browsing_pattern}
+- {price_insight}
+- {recent_purchases}
+- Engagement Level: {user_context['engagement_level']}"""
+    
+    def _build_enhanced_prompt(
+        self,
+        user: Optional[User],
+        user_context: Dict,
+        product: Dict,
+        source: str,
+        personality: str
+    ) -> str:
+        """Build a rich, contextual prompt for better explanations"""
+        
+        personality_config = self.PERSONALITIES.get(personality, self.PERSONALITIES['friendly'])
+        
         # calculate value proposition
         value_angle = self._identify_value_angle(product, user_context)
         psychological_trigger = self._get_psychological_trigger(source, user_context, product)
@@ -118,12 +191,7 @@ class LLMExplainer:
 {personality_config['style']}
 
 USER PROFILE:
-- Name: {user.name if user else 'This shopper'}
-- Shopping Behavior: {user_context['interaction_count']} interactions, {user_context['purchase_count']} purchases
-- {browsing_pattern}
-- {price_insight}
-- {recent_purchases}
-- Engagement Level: {user_context['engagement_level']}
+{self._format_user_profile(user, user_context)}
 
 PRODUCT BEING RECOMMENDED:
 - Name: {product['name']}
@@ -179,92 +247,87 @@ Generate the persuasive explanation NOW:"""
         
         return prompt
     
-    def _get_rich_user_context(self, user_id: int) -> Dict:
-        """Get comprehensive user behavioral context"""
-        
-        # get all interactions
-        interactions = self.db.query(Interaction).filter(
-            Interaction.user_id == user_id
-        ).order_by(Interaction.timestamp.desc()).all()
-        
-        if not interactions:
-            return {
-                'interaction_count': 0,
-                'purchase_count': 0,
-                'recent_purchases': [],
-                'top_categories': [],
-                'avg_purchase_price': 0,
-                'engagement_level': 'New User',
-                'favorite_tags': []
-            }
-        
-        # get product details
-        product_ids = list(set([i.product_id for i in interactions]))
-        products = self.db.query(Product).filter(
-            Product.id.in_(product_ids)
-        ).all()
-        product_map = {p.id: p for p in products}
-        
-        # analyze purchases
-        purchases = [i for i in interactions if i.interaction_type == 'purchase']
-        recent_purchases = []
-        purchase_prices = []
-        
-        for purchase in purchases[:5]:  # last 5 purchases
-            product = product_map.get(purchase.product_id)
-            if product:
-                recent_purchases.append({
-                    'name': product.name,
-                    'price': product.price,
-                    'category': product.category
-                })
-                purchase_prices.append(product.price)
-        
-        # category breakdown
-        category_counts = {}
-        all_tags = []
-        
-        for interaction in interactions:
-            product = product_map.get(interaction.product_id)
-            if product:
-                category_counts[product.category] = category_counts.get(product.category, 0) + 1
-                all_tags.extend(product.tags or [])
-        
-        # top categories with percentages
-        total_interactions = len(interactions)
-        top_categories = [
-            {
-                'category': cat,
-                'count': count,
-                'percentage': (count / total_interactions) * 100
-            }
-            for cat, count in sorted(category_counts.items(), key=lambda x: x[1], reverse=True)
-        ]
+    def _build_batched_prompt(
+        self,
+        user: Optional[User],
+        user_context: Dict,
+        recommendations: List[Dict],
+        personality: str
+    ) -> str:
+        """One prompt for all of a user's products; the user profile and persona are sent once"""
         
-        # engagement level
-        if len(interactions) < 5:
-            engagement = "New Explorer"
-        elif len(interactions) < 15:
-            engagement = "Regular Browser"
-        elif len(purchases) > 5:
-            engagement = "Loyal Customer"
-        else:
-            engagement = "Active Shopper"
-        
-        # favorite tags
-        from collections import Counter
-        tag_counts = Counter(all_tags)
-        favorite_tags = [tag for tag, _ in tag_counts.most_common(5)]
+        personality_config = self.PERSONALITIES.get(personality, self.PERSONALITIES['friendly'])
         
-        return {
-            'interaction_count': len(interactions),
-            'purchase_count': len(purchases),
-            'recent_purchases': recent_purchases,
-            'top_categories': top_categories,
-            'avg_purchase_price': sum(purchase_prices) / len(purchase_prices) if purchase_prices else 0,
-            'engagement_level': engagement,
-            'favorite_tags': favorite_tags
-        }
+        products = "\n\n".join(
+            f"""[product_id={rec['product']['id']}] {rec['product']['name']}
+- Category: {rec['product']['category']} | Price: ${rec['product']['price']:.2f} | Rating: {rec['product']['rating']}/5.0
+- Tags: {', '.join(rec['product'].get('tags', []))}
+- Why: {self._format_recommendation_reason(rec['source'], user_context, rec['product'])}
+- Value: {self._identify_value_angle(rec['product'], user_context)}"""
+            for rec in recommendations
+        )
+        
+        return f"""{personality_config['persona']}
+
+{personality_config['style']}
+
+USER PROFILE:
+{self._format_user_profile(user, user_context)}
+
+PRODUCTS BEING RECOMMENDED:
+{products}
+
+YOUR MISSION - MAKE THEM WANT TO BUY:
+For EACH product write a compelling, persuasive 2-3 sentence explanation (minimalist: ONE punchy sentence)
+that makes this user genuinely excited to purchase it. Reference their specific past behavior or purchases
+by name, use the rating as social proof, highlight the value relative to their usual spending, and end with
+forward momentum. NEVER say "based on your preferences" or other generic phrases.
+
+OUTPUT FORMAT:
+Return ONLY a JSON array (no markdown), one object per product, in the order given:
+[{{"product_id": <id>, "explanation": "<text>"}}]"""
+    
+    @staticmethod
+    def _parse_batched_response(text: str) -> Dict[int, str]:
+        """product_id -> explanation; unparseable items are simply missing"""
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            text = text[text.find("\n") + 1:] if "\n" in text else text
+        
+        try:
+            items = json.loads(text[text.find("["):text.rfind("]") + 1])
+        except ValueError:
+            # broken or truncated array: salvage the objects that do parse
+            items = []
+            for match in re.findall(r"\{[^{}]*\}", text):
+                try:
+                    items.append(json.loads(match))
+                except ValueError:
+                    continue
+        
+        explanations = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            explanation = item.get('explanation')
+            try:
+                product_id = int(item.get('product_id'))
+            except (TypeError, ValueError):
+                continue
+            if isinstance(explanation, str) and explanation.strip():
+                explanations[product_id] = explanation.strip()
+        
+        return explanations
+    
+    def _get_rich_user_context(self, user_id: int, user: Optional[User] = None) -> Dict:
+        """Get comprehensive user behavioral context (read from the materialized profile)"""
+        if user is None:
+            user = self.db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            return profile_context(None)
+        
+        return profile_context(load_profile(self.db, user))
     
     def _identify_value_angle(self, product: Dict, user_context: Dict) -> str:
         """Identify the strongest value proposition for this user"""
@@ -369,6 +432,14 @@ Generate the persuasive explanation NOW:"""
         
         return " | ".join(reasons) if reasons else "Recommended based on your shopping behavior"
     
+    def _safe_fallback(self, product: Dict, source: str, user_context: Dict) -> str:
+        """Fallback explanation that never raises, so one item cannot fail the whole response"""
+        try:
+            return self._fallback_explanation(product, source, user_context)
+        except Exception as e:
+            print(f"Fallback Error: {e}")
+            return "Recommended based on your shopping behavior"
+    
     def _fallback_explanation(self, product: Dict, source: str, user_context: Dict) -> str:
         """Enhanced PERSUASIVE fallback explanation"""
         
@@ -380,7 +451,7 @@ Generate the persuasive explanation NOW:"""
             if product['category'] == top_cat:
                 if user_context['purchase_count'] > 0:
                     return f"Given your {user_context['purchase_count']} purchases in {top_cat}, you clearly know quality when you see it. This {product['rating']}/5 rated {product['name']} is exactly what belongs in your collection at ${product['price']:.2f}!"
-                return f"You spend {top_cat['percentage']:.0f}% of your time browsing {top_cat} - this {product['rating']}/5 rated gem is EXACTLY what you're looking for!"
+                return f"You spend {user_context['top_categories'][0]['percentage']:.0f}% of your time browsing {top_cat} - this {product['rating']}/5 rated gem is EXACTLY what you're looking for!"
         
         # general persuasive fallback
         if product['rating'] >= 4.5:
@@ -389,25 +460,209 @@ Generate the persuasive explanation NOW:"""
         return f"This {product['rating']}/5 rated {product['name']} matches your shopping DNA perfectly. ${product['price']:.2f} for quality you can count on!"
     
     async def batch_explain(
+        self,
+        user_id: int,
+        recommendations: List[Dict],
+        personality: str = 'friendly',
+        mode: str = 'individual',
+        budget_ms: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Generate explanations for multiple recommendations
+        
+        mode: 'individual' runs one call per item concurrently (at most LLM_REQUEST_CONCURRENCY
+            per batch; the LLM pool caps them process-wide), 'batched' sends one prompt for all items
+        budget_ms: items not explained within this deadline get the fallback text; their LLM
+            calls keep running in the background and still fill the cache for the next view
+        """
+        timeout = budget_ms / 1000 if budget_ms and budget_ms > 0 else None
+        deadline = asyncio.get_running_loop().time() + timeout if timeout else None
+        
+        context = await run_in_threadpool(self.build_context, user_id)
+        if mode == 'batched':
+            return await self._explain_in_one_call(recommendations, personality, context, deadline)
+        
+        # one cache read for the whole batch; only the misses go to the LLM
+        keys = [self._cache_key(context, rec['product']['id'], personality) for rec in recommendations]
+        cached = await run_in_threadpool(self.cache.get_many, keys)
+        
+        semaphore = asyncio.Semaphore(settings.LLM_REQUEST_CONCURRENCY)
+        tasks = {
+            key: asyncio.ensure_future(self._explain_item(user_id, rec, personality, context, semaphore, use_cache=False))
+            for rec, key in zip(recommendations, keys)
+            if key not in cached
+        }
+        late = set()
+        if tasks:
+            _, late = await asyncio.wait(tasks.values(), timeout=self._remaining(deadline))
+        
+        # results are read back in ranking order
+        enriched, generated = [], {}
+        for rec, key in zip(recommendations, keys):
+            if key in cached:
+                enriched.append(self._explained(rec, cached[key], 'cache'))
+            elif tasks[key] in late:
+                self._finish_in_background(asyncio.ensure_future(self._store_when_done(tasks[key], key)))
+                enriched.append(self._explained(rec, self._safe_fallback(
+                    rec['product'], rec['source'], context['user_context']
+                ), 'fallback'))
+            else:
+                item = tasks[key].result()
+                if item['explanation_source'] == 'llm':
+                    generated[key] = item['explanation']
+                enriched.append(item)
+        
+        # and one cache write
+        if generated:
+            await run_in_threadpool(self.cache.set_many, generated)
+        
+        return enriched
+    
+    async def stream_explain(
         self,
         user_id: int,
         recommendations: List[Dict],
         personality: str = 'friendly'
+    ) -> AsyncIterator[Tuple[int, Dict]]:
+        """(rank index, explained item) pairs in completion order, each as soon as it is ready"""
+        semaphore = asyncio.Semaphore(settings.LLM_REQUEST_CONCURRENCY)
+        context = await run_in_threadpool(self.build_context, user_id)
+        
+        async def indexed(index: int, rec: Dict) -> Tuple[int, Dict]:
+            return index, await self._explain_item(user_id, rec, personality, context, semaphore)
+        
+        for next_done in asyncio.as_completed([
+            indexed(index, rec) for index, rec in enumerate(recommendations)
+        ]):
+            yield await next_done
+    
+    async def _explain_item(
+        self,
+        user_id: int,
+        rec: Dict,
+        personality: str,
+        context: Dict,
+        semaphore: asyncio.Semaphore,
+        use_cache: bool = True
+    ) -> Dict:
+        """
+        One recommendation plus its explanation; failures fall back for this item only
+        use_cache=False skips the cache read and write (the caller batches them)
+        """
+        async with semaphore:
+            try:
+                if use_cache:
+                    explanation, source = await self.explain_with_status(
+                        user_id=user_id,
+                        product=rec['product'],
+                        recommendation_source=rec['source'],
+                        personality=personality,
+                        context=context
+                    )
+                else:
+                    explanation, source = await self._generate(rec['product'], rec['source'], personality, context)
+            except Exception as e:
+                print(f"LLM Error: {e}")
+                explanation = self._safe_fallback(
+                    rec['product'], rec['source'], context['user_context']
+                )
+                source = 'fallback'
+        
+        return self._explained(rec, explanation, source)
+    
+    async def _explain_in_one_call(
+        self,
+        recommendations: List[Dict],
+        personality: str,
+        context: Dict,
+        deadline: Optional[float] = None
     ) -> List[Dict]:
-        """Generate explanations for multiple recommendations"""
-        enriched = []
+        """Cached items are reused; the rest share one prompt and one JSON-array response"""
+        keys = [
+            self._cache_key(context, rec['product']['id'], personality, f"{self.PROMPT_VERSION}-batched")
+            for rec in recommendations
+        ]
+        hits = await run_in_threadpool(self.cache.get_many, keys)
+        cached = [hits.get(key) for key in keys]
+        pending = [(rec, key) for rec, key, hit in zip(recommendations, keys, cached) if hit is None]
         
-        for rec in recommendations:
-            explanation = await self.explain_recommendation(
-                user_id=user_id,
-                product=rec['product'],
-                recommendation_source=rec['source'],
-                personality=personality
+        async def generate() -> Dict[int, str]:
+            prompt = self._build_batched_prompt(
+                context['user'], context['user_context'], [rec for rec, _ in pending], personality
             )
+            text = await self.client.generate(prompt, settings.LLM_MAX_TOKENS * len(pending))
+            generated = self._parse_batched_response(text)
             
-            enriched.append({
-                **rec,
-                'explanation': explanation
+            await run_in_threadpool(self.cache.set_many, {
+                key: generated[rec['product']['id']]
+                for rec, key in pending
+                if rec['product']['id'] in generated
             })
+            return generated
+        
+        generated: Dict[int, str] = {}
+        if pending:
+            task = asyncio.ensure_future(generate())
+            done, _ = await asyncio.wait({task}, timeout=self._remaining(deadline))
+            if task in done:
+                try:
+                    generated = task.result()
+                except CircuitOpenError:
+                    pass
+                except Exception as e:
+                    print(f"LLM Error: {e}")
+            else:
+                self._finish_in_background(task)
+        
+        enriched = []
+        for rec, hit in zip(recommendations, cached):
+            if hit is not None:
+                enriched.append(self._explained(rec, hit, 'cache'))
+            elif rec['product']['id'] in generated:
+                enriched.append(self._explained(rec, generated[rec['product']['id']], 'llm'))
+            else:
+                # missing, unparseable or late item: fall back for this item only
+                enriched.append(self._explained(rec, self._safe_fallback(
+                    rec['product'], rec['source'], context['user_context']
+                ), 'fallback'))
         
         return enriched
+    
+    def _cache_key(self, context: Dict, product_id: int, personality: str, prompt_version: Optional[str] = None) -> str:
+        return self.cache.key(
+            context['fingerprint'], product_id, personality,
+            settings.LLM_MODEL, prompt_version or str(self.PROMPT_VERSION)
+        )
+    
+    async def _store_when_done(self, task: asyncio.Task, key: str) -> None:
+        """Cache a late item's explanation once its LLM call finishes"""
+        item = await task
+        if item['explanation_source'] == 'llm':
+            await run_in_threadpool(self.cache.set, key, item['explanation'])
+    
+    @staticmethod
+    def _explained(rec: Dict, explanation: str, source: str) -> Dict:
+        return {
+            **rec,
+            'explanation': explanation,
+            'explanation_source': source,
+            'cache_status': 'hit' if source == 'cache' else 'miss'
+        }
+    
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return None
+        return max(0.0, deadline - asyncio.get_running_loop().time())
+    
+    @staticmethod
+    def _finish_in_background(task: asyncio.Task) -> None:
+        """Let a late LLM call complete (and fill the cache) after the response is sent"""
+        _late_tasks.add(task)
+        
+        def done(finished: asyncio.Task) -> None:
+            _late_tasks.discard(finished)
+            if not finished.cancelled() and finished.exception() is not None:
+                print(f"LLM Error (late): {finished.exception()}")
+        
+        task.add_done_callback(done)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+import numpy as np
+from scipy import sparse
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class NeighbourTable:
+    """
+    Compact top-K neighbour table
+    Row i holds the K most similar rows to ids[i] as (position, score) arrays, -1 padded
+    """
+    
+    def __init__(self, ids: np.ndarray, neighbours: np.ndarray, scores: np.ndarray):
+        self.ids = ids
+        self.neighbours = neighbours
+        self.scores = scores
+        self.index: Dict[int, int] = {int(id_): pos for pos, id_ in enumerate(ids)}
+        self._matrix: Optional[sparse.csr_matrix] = None
+    
+    @property
+    def k(self) -> int:
+        return self.neighbours.shape[1]
+    
+    @classmethod
+    def from_vectors(
+        cls,
+        ids: Sequence[int],
+        vectors: sparse.csr_matrix,
+        k: int,
+        chunk_size: int = 512
+    ) -> "NeighbourTable":
+        """
+        Build from L2-normalized row vectors (cosine similarity)
+        Similarities are computed a chunk of rows at a time to bound memory
+        """
+        n = vectors.shape[0]
+        neighbours = np.full((n, k), -1, dtype=np.int32)
+        scores = np.zeros((n, k), dtype=np.float32)
+        vectors_t = vectors.T.tocsc()
+        
+        for start in range(0, n, chunk_size):
+            block = sparse.csr_matrix(vectors[start:start + chunk_size] @ vectors_t)
+            
+            for offset in range(block.shape[0]):
+                row = start + offset
+                lo, hi = block.indptr[offset], block.indptr[offset + 1]
+                cols, sims = block.indices[lo:hi], block.data[lo:hi]
+                
+                # drop self-similarity and non-positive scores
+                keep = (cols != row) & (sims > 0)
+                cols, sims = cols[keep], sims[keep]
+                
+                if cols.size > k:
+                    top = np.argpartition(-sims, k - 1)[:k]
+                    cols, sims = cols[top], sims[top]
+                
+                order = np.lexsort((cols, -sims))
+                neighbours[row, :order.size] = cols[order]
+                scores[row, :order.size] = sims[order]
+        
+        return cls(np.asarray(ids, dtype=np.int64), neighbours, scores)
+    
+    def as_matrix(self) -> sparse.csr_matrix:
+        """The table as a sparse (n x n) similarity matrix, for batch scoring"""
+        if self._matrix is None:
+            n = len(self.ids)
+            valid = self.neighbours >= 0
+            rows = np.repeat(np.arange(n), valid.sum(axis=1))
+            self._matrix = sparse.csr_matrix(
+                (self.scores[valid].astype(np.float64), (rows, self.neighbours[valid])),
+                shape=(n, n)
+            )
+        return self._matrix
+    
+    def neighbours_of(self, id_: int, n: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(neighbour id, score) pairs for one id, best first"""
+        pos = self.index.get(id_)
+        if pos is None:
+            return []
+        
+        cols = self.neighbours[pos, :n]
+        valid = cols >= 0
+        return [
+            (int(self.ids[col]), float(score))
+            for col, score in zip(cols[valid], self.scores[pos, :n][valid])
+        ]
+    
+    def save(self, path: str) -> None:
+        """Persist as a single compressed .npz file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, ids=self.ids, neighbours=self.neighbours, scores=self.scores)
+    
+    @classmethod
+    def load(cls, path: str) -> Optional["NeighbourTable"]:
+        """Load a table saved with save(), or None if the file is missing"""
+        if not os.path.exists(path):
+            return None
+        
+        data = np.load(path)
+        return cls(data['ids'], data['neighbours'], data['scores'])
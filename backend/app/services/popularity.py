@@ -0,0 +1,166 @@
+import math
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from functools import lru_cache
+from sqlalchemy.orm import Session
+
+from app.models.interaction import Interaction
+from app.models.popularity import ProductPopularity
+from app.config import get_settings
+
+settings = get_settings()
+
+
+def _epoch(moment: Optional[datetime]) -> float:
+    """Seconds since epoch; naive datetimes are taken as UTC (SQLite CURRENT_TIMESTAMP)"""
+    if moment is None:
+        return datetime.now(timezone.utc).timestamp()
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class PopularityTracker:
+    """
+    In-memory, exponentially time-decayed popularity counters
+    
+    Scores are kept relative to a fixed anchor time, so a new event only touches its own
+    product and never requires decaying every counter. A pre-sorted top list is maintained
+    incrementally; dirty counters are flushed to the product_popularity table in batches.
+    """
+    
+    def __init__(self, half_life_days: float, top_size: int = 200, flush_every: int = 50):
+        self.decay_rate = math.log(2) / (half_life_days * 86400)
+        self.top_size = top_size
+        self.flush_every = flush_every
+        self.is_loaded = False
+        
+        self._anchor = _epoch(None)
+        self._scores: Dict[int, float] = {}
+        self._counts: Dict[int, int] = {}
+        self._top: List[int] = []
+        self._dirty: Set[int] = set()
+        self._last_id = 0  # highest interaction id counted
+        self._lock = threading.RLock()
+    
+    def load(self, db: Session) -> None:
+        """Restore counters from the summary table and replay interactions since the last flush"""
+        rows = db.query(ProductPopularity).all()
+        
+        with self._lock:
+            self._anchor = _epoch(None)
+            self._scores, self._counts, self._dirty = {}, {}, set()
+            self._last_id = 0
+            
+            for row in rows:
+                self._scores[row.product_id] = row.score * self._growth(_epoch(row.updated_at))
+                self._counts[row.product_id] = row.interaction_count
+            
+            # anything committed after the last flush (or everything, on first run); ids follow
+            # commit order, timestamps do not (write-behind stores when an event was queued)
+            last_ids = [row.last_interaction_id for row in rows if row.last_interaction_id is not None]
+            query = db.query(Interaction.id, Interaction.product_id, Interaction.weight, Interaction.timestamp)
+            if last_ids:
+                self._last_id = max(last_ids)
+                query = query.filter(Interaction.id > self._last_id)
+            elif rows:
+                # summary rows written before id watermarks existed
+                query = query.filter(Interaction.timestamp > max(row.updated_at for row in rows))
+            
+            for interaction_id, product_id, weight, timestamp in query.yield_per(10000):
+                self._add(product_id, weight or 1.0, _epoch(timestamp))
+                self._last_id = max(self._last_id, interaction_id)
+            
+            self._rebuild_top()
+            self.is_loaded = True
+    
+    def ensure_loaded(self, db: Session) -> None:
+        """Load lazily when used outside the app lifespan (scripts, shells)"""
+        if not self.is_loaded:
+            self.load(db)
+    
+    def record_many(self, events: List[Tuple[int, float, Optional[datetime]]], last_id: Optional[int] = None) -> None:
+        """
+        Count a batch of (product_id, weight, timestamp or None for now) interactions, re-sorting the top list once
+        last_id: highest interactions.id in the batch, persisted as the replay watermark
+        """
+        with self._lock:
+            if last_id is not None:
+                self._last_id = max(self._last_id, last_id)
+            now = _epoch(None)
+            for product_id, weight, timestamp in events:
+                self._add(product_id, weight, now if timestamp is None else _epoch(timestamp))
+            
+            # scores only grow, so the new top list comes from the old one plus the touched products
+            candidates = set(self._top).union(product_id for product_id, _, _ in events)
+            self._top = sorted(candidates, key=self._scores.__getitem__, reverse=True)[:self.top_size]
+    
+    def top(self, n: int) -> List[Tuple[int, float]]:
+        """Most popular (product_id, current decayed score) pairs"""
+        with self._lock:
+            decay = 1.0 / self._growth(_epoch(None))
+            return [(pid, self._scores[pid] * decay) for pid in self._top[:n]]
+    
+    def should_flush(self) -> bool:
+        return len(self._dirty) >= self.flush_every
+    
+    def flush(self, db: Session) -> None:
+        """Write dirty counters as summary rows and commit; they stay dirty if the commit fails"""
+        with self._lock:
+            if not self._dirty:
+                return
+            
+            now = datetime.now(timezone.utc)
+            decay = 1.0 / self._growth(now.timestamp())
+            staged = {product_id: self._counts[product_id] for product_id in self._dirty}
+            for product_id in staged:
+                db.merge(ProductPopularity(
+                    product_id=product_id,
+                    score=self._scores[product_id] * decay,
+                    interaction_count=self._counts[product_id],
+                    updated_at=now.replace(tzinfo=None),
+                    last_interaction_id=self._last_id
+                ))
+        
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️  Popularity flush failed, will retry: {e}")
+            return
+        
+        with self._lock:
+            # products counted again while committing stay dirty for the next flush
+            self._dirty.difference_update(
+                product_id for product_id, count in staged.items() if self._counts[product_id] == count
+            )
+    
+    def _add(self, product_id: int, weight: float, moment: float) -> None:
+        if moment - self._anchor > 50 * math.log(2) / self.decay_rate:
+            self._reanchor(moment)
+        
+        self._scores[product_id] = self._scores.get(product_id, 0.0) + weight * self._growth(moment)
+        self._counts[product_id] = self._counts.get(product_id, 0) + 1
+        self._dirty.add(product_id)
+    
+    def _growth(self, moment: float) -> float:
+        return math.exp(self.decay_rate * (moment - self._anchor))
+    
+    def _reanchor(self, moment: float) -> None:
+        """Move the anchor forward (every ~50 half-lives) to keep scores in float range"""
+        scale = 1.0 / self._growth(moment)
+        self._scores = {pid: score * scale for pid, score in self._scores.items()}
+        self._anchor = moment
+    
+    def _rebuild_top(self) -> None:
+        self._top = sorted(self._scores, key=self._scores.__getitem__, reverse=True)[:self.top_size]
+
+
+@lru_cache()
+def get_popularity_tracker() -> PopularityTracker:
+    """Get the shared popularity tracker instance"""
+    return PopularityTracker(
+        half_life_days=settings.POPULARITY_HALF_LIFE_DAYS,
+        flush_every=settings.POPULARITY_FLUSH_EVERY
+    )
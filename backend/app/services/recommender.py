@@ -1,15 +1,19 @@
 import numpy as np
 from typing import List, Dict, Tuple
-from sqlalchemy import func
 from sqlalchemy.orm import Session
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
 from collections import defaultdict
 import random
 
 from app.models.product import Product
 from app.models.user import User
-from app.models.interaction import Interaction
+from app.models.interaction import Interaction, INTERACTION_WEIGHTS
+from app.services.interaction_matrix import get_interaction_matrix
+from app.services.ann import get_user_ann_index
+from app.services.item_knn import get_item_knn_model
+from app.services.als import get_als_model
+from app.services.content_model import get_content_model
+from app.services.popularity import get_popularity_tracker
+from app.services.result_cache import get_recommendation_cache
 from app.config import get_settings
 
 settings = get_settings()
@@ -18,26 +22,52 @@ settings = get_settings()
 class RecommenderEngine:
     """Hybrid recommendation system"""
     
+    STRATEGIES = ('hybrid', 'item_knn', 'als')
+    
     def __init__(self, db: Session):
         self.db = db
-        self.interaction_weights = {
-            'view': 1.0,
-            'cart': 2.0,
-            'wishlist': 3.0,
-            'purchase': 5.0,
-            'rating': 4.0
-        }
+        self.interaction_weights = INTERACTION_WEIGHTS
+        self.interaction_matrix = get_interaction_matrix()
+        self.item_knn = get_item_knn_model()
+        self.als = get_als_model()
+        self.content_model = get_content_model()
+        self.popularity = get_popularity_tracker()
+        self.cache = get_recommendation_cache()
     
     def get_recommendations(
         self, 
         user_id: int, 
         n: int = 10,
-        include_serendipity: bool = True
+        include_serendipity: bool = True,
+        strategy: str = 'hybrid'
     ) -> List[Dict]:
         """
         Get personalized recommendations for a user
         Returns list of dicts with product and score
+        
+        strategy: 'hybrid' (user-based CF + content), 'item_knn' (item-item CF)
+            or 'als' (implicit matrix factorization)
         """
+        # ranked lists are cached until the user interacts or the models are rebuilt
+        cache_key = (user_id, n, strategy, include_serendipity)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # an interaction posted while computing bumps the generation, and the stale result is not cached
+        generation = self.cache.generation(user_id)
+        recommendations = self._compute_recommendations(user_id, n, include_serendipity, strategy)
+        self.cache.set(cache_key, recommendations, generation)
+        return recommendations
+    
+    def _compute_recommendations(
+        self,
+        user_id: int,
+        n: int,
+        include_serendipity: bool,
+        strategy: str
+    ) -> List[Dict]:
+        """Run the full pipeline for one user (uncached)"""
         # get user's interaction history
         interactions = self._get_user_interactions(user_id)
         
@@ -45,12 +75,17 @@ class RecommenderEngine:
             # cold start: use popularity + content-based
             return self._cold_start_recommendations(user_id, n)
         
-        # warm start: hybrid approach
-        collab_recs = self._collaborative_filtering(user_id, interactions)
-        content_recs = self._content_based_filtering(user_id, interactions)
-        
-        # merge and rank
-        merged = self._merge_recommendations(collab_recs, content_recs)
+        if strategy == 'item_knn':
+            merged = self._item_knn_filtering(user_id, interactions)
+        elif strategy == 'als':
+            merged = self._als_filtering(user_id, interactions, n)
+        else:
+            # warm start: hybrid approach
+            collab_recs = self._collaborative_filtering(user_id, interactions)
+            content_recs = self._content_based_filtering(user_id, interactions)
+            
+            # merge and rank
+            merged = self._merge_recommendations(collab_recs, content_recs)
         
         # add serendipity
         if include_serendipity:
@@ -77,45 +112,101 @@ class RecommenderEngine:
         User-based collaborative filtering
         Find similar users and recommend what they liked
         """
-        # build user-item matrix
-        user_item_matrix = self._build_user_item_matrix()
+        # read the shared user-item matrix (no database access)
+        self.interaction_matrix.ensure_built(self.db)
+        matrix, normalized, version = self.interaction_matrix.snapshot()
+        row = self.interaction_matrix.user_row(user_id)
         
-        if user_id not in user_item_matrix:
+        if row is None or row >= matrix.shape[0]:
             return []
         
-        # calculate user similarity
-        target_vector = user_item_matrix[user_id]
-        similarities = {}
-        
-        for other_user_id, other_vector in user_item_matrix.items():
-            if other_user_id == user_id:
-                continue
+        if settings.ANN_ENABLED and matrix.shape[0] >= settings.ANN_MIN_USERS:
+            # approximate: exact cosine only over LSH bucket candidates
+            candidates = get_user_ann_index().query(matrix, row, version)
             
-            # cosine similarity
-            sim = self._cosine_similarity(target_vector, other_vector)
-            if sim > 0:
-                similarities[other_user_id] = sim
+            similarities = np.zeros(matrix.shape[0])
+            if candidates.size:
+                similarities[candidates] = (normalized[candidates] @ normalized[row].T).toarray().ravel()
+        else:
+            # cosine similarity against every user in one sparse mat-vec
+            similarities = (normalized @ normalized[row].T).toarray().ravel()
+        similarities[row] = 0.0
+        
+        neighbours = self._top_k_indices(similarities, 10)  # top 10 similar users
+        if neighbours.size == 0:
+            return []
         
-        # get recommendations from similar users
-        recommendations = defaultdict(float)
-        user_product_ids = set(target_vector.keys())
+        # similarity-weighted sum of neighbour rows as a single sparse product
+        scores = matrix[neighbours].T @ similarities[neighbours]
+        scores[matrix[row].indices] = 0.0  # skip products the user already has
+        # ... including ones from writes not yet folded into the matrix
+        for interaction in interactions:
+            col = self.interaction_matrix.product_column(interaction.product_id)
+            if col is not None and col < scores.size:
+                scores[col] = 0.0
         
-        for other_user_id, similarity in sorted(
-            similarities.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:10]:  # top 10 similar users
-            other_vector = user_item_matrix[other_user_id]
-            
-            for product_id, weight in other_vector.items():
-                if product_id not in user_product_ids:
-                    recommendations[product_id] += weight * similarity
+        product_ids = self.interaction_matrix.product_ids
+        return [
+            {'product_id': product_ids[col], 'score': float(scores[col]), 'source': 'collaborative'}
+            for col in np.flatnonzero(scores > 0)
+        ]
+    
+    def _item_knn_filtering(
+        self, 
+        user_id: int, 
+        interactions: List[Interaction]
+    ) -> List[Dict]:
+        """
+        Item-based collaborative filtering
+        Sum the precomputed neighbour lists of everything the user touched
+        """
+        if self.item_knn.table is None:
+            # no offline table yet: build one from the shared matrix
+            self.interaction_matrix.ensure_built(self.db)
+            self.item_knn.build(self.interaction_matrix)
+        
+        history = self._weighted_history(interactions)
         
         return [
-            {'product_id': pid, 'score': score, 'source': 'collaborative'}
-            for pid, score in recommendations.items()
+            {'product_id': pid, 'score': score, 'source': 'item_knn'}
+            for pid, score in self.item_knn.score(history).items()
         ]
     
+    def _als_filtering(
+        self, 
+        user_id: int, 
+        interactions: List[Interaction],
+        n: int
+    ) -> List[Dict]:
+        """
+        Matrix factorization
+        One dense dot product of the user's factors against all item factors
+        """
+        if not self.als.is_trained:
+            # no offline factors yet: train once from the shared matrix
+            self.interaction_matrix.ensure_built(self.db)
+            self.als.ensure_trained(self.interaction_matrix)
+        
+        history = self._weighted_history(interactions)
+        user_vector = self.als.user_vector(user_id, history)
+        if user_vector is None:
+            return []
+        
+        return [
+            {'product_id': pid, 'score': score, 'source': 'als'}
+            for pid, score in self.als.recommend(user_vector, n, exclude=history)
+        ]
+    
+    def _weighted_history(self, interactions: List[Interaction]) -> Dict[int, float]:
+        """Sum interaction weights per product for one user"""
+        history = defaultdict(float)
+        for interaction in interactions:
+            history[interaction.product_id] += self.interaction_weights.get(
+                interaction.interaction_type, 
+                1.0
+            )
+        return history
+    
     def _content_based_filtering(
         self, 
         user_id: int, 
@@ -125,46 +216,19 @@ class RecommenderEngine:
         Content-based filtering
         Recommend similar products based on content features
         """
-        # get products user has interacted with
-        interacted_product_ids = [i.product_id for i in interactions]
-        interacted_products = self.db.query(Product).filter(
-            Product.id.in_(interacted_product_ids)
-        ).all()
-        
-        if not interacted_products:
-            return []
-        
-        # build product profiles
-        all_products = self.db.query(Product).all()
-        product_profiles = {}
-        
-        for product in all_products:
-            # combine text features
-            text = f"{product.name} {product.category} {' '.join(product.tags or [])}"
-            product_profiles[product.id] = text
-        
-        # TF-IDF vectorization
-        vectorizer = TfidfVectorizer(stop_words='english', max_features=100)
-        product_ids = list(product_profiles.keys())
-        texts = [product_profiles[pid] for pid in product_ids]
-        
-        tfidf_matrix = vectorizer.fit_transform(texts)
-        
-        # calculate average profile of liked products
-        liked_indices = [product_ids.index(p.id) for p in interacted_products]
-        liked_vectors = tfidf_matrix[liked_indices]
-        user_profile = np.asarray(liked_vectors.mean(axis=0))
-        
-        # find similar products
-        similarities = cosine_similarity(user_profile, tfidf_matrix)[0]
+        # score the whole catalog against the user's content profile
+        self.content_model.ensure_built(self.db)
+        interacted_product_ids = set(i.product_id for i in interactions)
+        similarities = self.content_model.score(interacted_product_ids)
+        product_ids = self.content_model.product_ids
         
         recommendations = []
-        for idx, similarity in enumerate(similarities):
+        for idx in np.flatnonzero(similarities > 0):
             product_id = product_ids[idx]
-            if product_id not in interacted_product_ids and similarity > 0:
+            if product_id not in interacted_product_ids:
                 recommendations.append({
                     'product_id': product_id,
-                    'score': float(similarity),
+                    'score': float(similarities[idx]),
                     'source': 'content'
                 })
         
@@ -172,27 +236,19 @@ class RecommenderEngine:
     
     def _cold_start_recommendations(self, user_id: int, n: int) -> List[Dict]:
         """Recommendations for new users (popularity-based)"""
-        # get popular products (most interactions)
-        popular = self.db.query(
-            Interaction.product_id,
-            func.count(Interaction.id).label('interaction_count'),
-            func.avg(Interaction.weight).label('avg_weight')
-        ).group_by(
-            Interaction.product_id
-        ).order_by(
-            func.count(Interaction.id).desc()
-        ).limit(n * 2).all()
+        # lookup into the incrementally maintained, time-decayed top list
+        self.popularity.ensure_loaded(self.db)
         
         recommendations = [
             {
-                'product_id': p.product_id,
-                'score': float(p.interaction_count * p.avg_weight),
+                'product_id': product_id,
+                'score': float(score),
                 'source': 'popularity'
             }
-            for p in popular
+            for product_id, score in self.popularity.top(n)
         ]
         
-        return self._enrich_recommendations(recommendations[:n])
+        return self._enrich_recommendations(recommendations)
     
     def _merge_recommendations(
         self, 
@@ -281,34 +337,12 @@ class RecommenderEngine:
         
         return enriched
     
-    def _build_user_item_matrix(self) -> Dict[int, Dict[int, float]]:
-        """Build sparse user-item interaction matrix"""
-        interactions = self.db.query(Interaction).all()
-        
-        matrix = defaultdict(lambda: defaultdict(float))
-        
-        for interaction in interactions:
-            weight = self.interaction_weights.get(
-                interaction.interaction_type, 
-                1.0
-            )
-            matrix[interaction.user_id][interaction.product_id] += weight
-        
-        return dict(matrix)
-    
     @staticmethod
-    def _cosine_similarity(vec1: Dict, vec2: Dict) -> float:
-        """Calculate cosine similarity between two sparse vectors"""
-        common_keys = set(vec1.keys()) & set(vec2.keys())
-        
-        if not common_keys:
-            return 0.0
-        
-        dot_product = sum(vec1[k] * vec2[k] for k in common_keys)
-        mag1 = np.sqrt(sum(v**2 for v in vec1.values()))
-        mag2 = np.sqrt(sum(v**2 for v in vec2.values()))
-        
-        if mag1 == 0 or mag2 == 0:
-            return 0.0
-        
-        return dot_product / (mag1 * mag2)
\ No newline at end of file
+    def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest positive scores, best first"""
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        
+        # stable order: score desc, then index asc
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
@@ -0,0 +1,272 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from functools import lru_cache
+
+from app.services.interaction_matrix import get_interaction_matrix
+from app.config import get_settings
+
+settings = get_settings()
+
+CacheKey = Tuple[int, int, str, bool]  # (user_id, n, strategy, include_serendipity)
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry expiry; only visible to the current worker"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._user_keys: Dict[int, Set[Tuple]] = {}
+        self._generations: Dict[int, int] = {}
+    
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        """(model version, user's invalidation count); a set under an older generation is dropped"""
+        return self.version, self._generations.get(user_id, 0)
+    
+    def get(self, key: CacheKey) -> Optional[List[Dict]]:
+        full_key = (self.version,) + key
+        entry = self._entries.get(full_key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at < time.time():
+            self._remove(full_key)
+            return None
+        
+        self._entries.move_to_end(full_key)
+        return value
+    
+    def set(self, key: CacheKey, value: List[Dict], ttl: float, generation: Tuple[int, int]) -> Optional[int]:
+        """Store an entry; returns how many entries were evicted to make room, None if it was stale"""
+        if generation != self.generation(key[0]):
+            return None
+        
+        full_key = (self.version,) + key
+        self._entries[full_key] = (time.time() + ttl, value)
+        self._entries.move_to_end(full_key)
+        self._user_keys.setdefault(key[0], set()).add(full_key)
+        
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            evicted += 1
+        return evicted
+    
+    def invalidate_user(self, user_id: int) -> None:
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        for full_key in self._user_keys.pop(user_id, ()):
+            self._entries.pop(full_key, None)
+    
+    def bump_version(self) -> None:
+        # older entries can never be read again, so drop them now
+        self.version += 1
+        self._entries.clear()
+        self._user_keys.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _remove(self, full_key: Tuple) -> None:
+        self._entries.pop(full_key, None)
+        keys = self._user_keys.get(full_key[1])
+        if keys is not None:
+            keys.discard(full_key)
+            if not keys:
+                del self._user_keys[full_key[1]]
+
+
+class SQLiteCacheBackend:
+    """
+    Cache table in a local SQLite file, shared by every worker on the host
+    The model version lives in the same file so a rebuild in one worker invalidates all
+    """
+    
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            "key TEXT PRIMARY KEY, user_id INTEGER, version INTEGER, "
+            "expires_at REAL, last_used REAL, value TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_result_cache_user ON result_cache (user_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_result_cache_used ON result_cache (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS result_cache_meta (id INTEGER PRIMARY KEY, version INTEGER)")
+        self._conn.execute("INSERT OR IGNORE INTO result_cache_meta (id, version) VALUES (1, 0)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache_generation (user_id INTEGER PRIMARY KEY, generation INTEGER)"
+        )
+    
+    @property
+    def version(self) -> int:
+        return self._conn.execute("SELECT version FROM result_cache_meta WHERE id = 1").fetchone()[0]
+    
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        """(model version, user's invalidation count) as seen by every worker"""
+        return tuple(self._conn.execute(
+            "SELECT (SELECT version FROM result_cache_meta WHERE id = 1), "
+            "COALESCE((SELECT generation FROM result_cache_generation WHERE user_id = ?), 0)",
+            (user_id,)
+        ).fetchone())
+    
+    def get(self, key: CacheKey) -> Optional[List[Dict]]:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT value FROM result_cache WHERE key = ? AND expires_at >= ? "
+            "AND version = (SELECT version FROM result_cache_meta WHERE id = 1)",
+            (self._key(key), now)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        self._conn.execute("UPDATE result_cache SET last_used = ? WHERE key = ?", (now, self._key(key)))
+        return json.loads(row[0])
+    
+    def set(self, key: CacheKey, value: List[Dict], ttl: float, generation: Tuple[int, int]) -> Optional[int]:
+        now = time.time()
+        # a single statement, so an invalidation from another worker cannot slip in between
+        inserted = self._conn.execute(
+            "INSERT OR REPLACE INTO result_cache (key, user_id, version, expires_at, last_used, value) "
+            "SELECT ?, ?, version, ?, ?, ? FROM result_cache_meta WHERE id = 1 AND version = ? "
+            "AND COALESCE((SELECT generation FROM result_cache_generation WHERE user_id = ?), 0) = ?",
+            (self._key(key), key[0], now + ttl, now, json.dumps(value), generation[0], key[0], generation[1])
+        ).rowcount
+        if not inserted:
+            return None
+        
+        overflow = len(self) - self.max_entries
+        if overflow <= 0:
+            return 0
+        
+        # expired and stale-version rows go first, then least recently used
+        self._conn.execute(
+            "DELETE FROM result_cache WHERE key IN ("
+            "SELECT key FROM result_cache ORDER BY "
+            "(expires_at < ? OR version != (SELECT version FROM result_cache_meta WHERE id = 1)) DESC, "
+            "last_used LIMIT ?)",
+            (now, overflow)
+        )
+        return overflow
+    
+    def invalidate_user(self, user_id: int) -> None:
+        self._conn.execute(
+            "INSERT INTO result_cache_generation (user_id, generation) VALUES (?, 1) "
+            "ON CONFLICT (user_id) DO UPDATE SET generation = generation + 1",
+            (user_id,)
+        )
+        self._conn.execute("DELETE FROM result_cache WHERE user_id = ?", (user_id,))
+    
+    def bump_version(self) -> None:
+        self._conn.execute("UPDATE result_cache_meta SET version = version + 1 WHERE id = 1")
+        self._conn.execute(
+            "DELETE FROM result_cache WHERE version != (SELECT version FROM result_cache_meta WHERE id = 1)"
+        )
+    
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+    
+    @staticmethod
+    def _key(key: CacheKey) -> str:
+        return json.dumps(list(key))
+
+
+class RecommendationCache:
+    """
+    LRU + TTL cache of ranked recommendation lists
+    
+    Keyed by (user_id, n, strategy, serendipity) under the current model version.
+    A user's entries are dropped when they post an interaction; every entry is
+    dropped when the models are rebuilt (version bump). Both also advance the user's
+    generation: read it before computing and pass it to set(), and a result computed
+    across an invalidation is not stored.
+    """
+    
+    def __init__(self, backend, ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_writes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key: CacheKey) -> Optional[List[Dict]]:
+        with self._lock:
+            value = self.backend.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+        # callers decorate the list (explanations), so hand out a copy
+        return [dict(rec) for rec in value]
+    
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        with self._lock:
+            return self.backend.generation(user_id)
+    
+    def set(self, key: CacheKey, value: List[Dict], generation: Tuple[int, int]) -> None:
+        with self._lock:
+            evicted = self.backend.set(key, [dict(rec) for rec in value], self.ttl_seconds, generation)
+            if evicted is None:
+                self.stale_writes += 1
+            else:
+                self.evictions += evicted
+    
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self.backend.invalidate_user(user_id)
+            self.invalidations += 1
+    
+    def bump_version(self) -> None:
+        with self._lock:
+            self.backend.bump_version()
+    
+    def on_matrix_change(self, rows) -> None:
+        """
+        Interaction matrix listener: a full rebuild is a new model version
+        When pending writes are folded in, rankings those users got from the older matrix are dropped
+        """
+        if rows is None:
+            self.bump_version()
+            return
+        
+        user_ids = get_interaction_matrix().user_ids
+        for row in rows:
+            self.invalidate_user(user_ids[row])
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": len(self.backend),
+                "model_version": self.backend.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_writes": self.stale_writes
+            }
+
+
+@lru_cache()
+def get_recommendation_cache() -> RecommendationCache:
+    """Get the shared recommendation cache (backend chosen by RESULT_CACHE_BACKEND)"""
+    if settings.RESULT_CACHE_BACKEND == 'sqlite':
+        backend = SQLiteCacheBackend(settings.RESULT_CACHE_PATH, settings.RESULT_CACHE_MAX_ENTRIES)
+    else:
+        backend = MemoryCacheBackend(settings.RESULT_CACHE_MAX_ENTRIES)
+    
+    cache = RecommendationCache(backend, settings.RESULT_CACHE_TTL_SECONDS)
+    get_interaction_matrix().add_listener(cache.on_matrix_change)
+    return cache
\ No newline at end of file
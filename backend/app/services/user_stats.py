@@ -0,0 +1,126 @@
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Set, Tuple
+from sqlalchemy import DateTime, func, case, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+from app.models.interaction import Interaction
+from app.models.user_stats import UserCategoryStats
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _aggregate_query():
+    """(user_id, category, interactions, purchases, spent) with one joined GROUP BY"""
+    is_purchase = Interaction.interaction_type == 'purchase'
+    return select(
+        Interaction.user_id,
+        Product.category,
+        func.count(Interaction.id),
+        func.sum(case((is_purchase, 1), else_=0)),
+        func.sum(case((is_purchase, Product.price), else_=0.0))
+    ).join(
+        Product, Product.id == Interaction.product_id
+    ).group_by(Interaction.user_id, Product.category)
+
+
+def record_interactions(db: Session, rows_by_user: Dict[int, List[Tuple[str, Product]]]) -> None:
+    """Fold new (interaction_type, product) pairs per user into the rollup rows (committed by the caller)"""
+    existing = {
+        (row.user_id, row.category): row
+        for row in db.query(UserCategoryStats).filter(UserCategoryStats.user_id.in_(list(rows_by_user))).all()
+    }
+    
+    # users with no rows yet are rolled up from their history first
+    missing = set(rows_by_user) - {user_id for user_id, _ in existing}
+    if missing:
+        for row in _backfill(db, missing):
+            existing[(row.user_id, row.category)] = row
+    
+    now = _utcnow()
+    for user_id, rows in rows_by_user.items():
+        for interaction_type, product in rows:
+            row = existing.get((user_id, product.category))
+            if row is None:
+                row = UserCategoryStats(
+                    user_id=user_id,
+                    category=product.category,
+                    interaction_count=0,
+                    purchase_count=0,
+                    total_spent=0.0
+                )
+                db.add(row)
+                existing[(user_id, product.category)] = row
+            
+            row.interaction_count += 1
+            if interaction_type == 'purchase':
+                row.purchase_count += 1
+                row.total_spent += product.price
+            row.updated_at = now
+
+
+def category_stats(db: Session, user_id: int) -> List[UserCategoryStats]:
+    """The user's rollup rows, most-interacted category first; aggregated and stored on first use"""
+    rows = db.query(UserCategoryStats).filter(
+        UserCategoryStats.user_id == user_id
+    ).order_by(UserCategoryStats.interaction_count.desc(), UserCategoryStats.category).all()
+    if rows:
+        return rows
+    
+    # not rolled up yet (or no interactions at all)
+    if not _backfill(db, {user_id}):
+        return []
+    
+    db.commit()
+    return category_stats(db, user_id)
+
+
+def summarize(rows: List[UserCategoryStats]) -> Dict:
+    """Analytics totals from a user's rollup rows"""
+    return {
+        "total_interactions": sum(row.interaction_count for row in rows),
+        "categories_explored": {row.category: row.interaction_count for row in rows},
+        "total_purchases": sum(row.purchase_count for row in rows),
+        "total_spent": round(sum(row.total_spent for row in rows), 2),
+        "favorite_category": rows[0].category if rows else None
+    }
+
+
+def _backfill(db: Session, user_ids: Set[int]) -> List[UserCategoryStats]:
+    """Add rollup rows for users who have none, from one GROUP BY over their history"""
+    now = _utcnow()
+    rows = [
+        UserCategoryStats(
+            user_id=user_id,
+            category=category,
+            interaction_count=interactions,
+            purchase_count=purchases,
+            total_spent=spent,
+            updated_at=now
+        )
+        for user_id, category, interactions, purchases, spent in db.execute(
+            _aggregate_query().where(Interaction.user_id.in_(list(user_ids)))
+        ).all()
+    ]
+    db.add_all(rows)
+    return rows
+
+
+def rebuild_user_stats(db: Session) -> int:
+    """Recompute the whole rollup table with a single INSERT ... SELECT; returns the row count"""
+    start = time.perf_counter()
+    
+    db.query(UserCategoryStats).delete(synchronize_session=False)
+    
+    db.execute(insert(UserCategoryStats).from_select(
+        ['user_id', 'category', 'interaction_count', 'purchase_count', 'total_spent', 'updated_at'],
+        _aggregate_query().add_columns(literal(_utcnow(), DateTime))
+    ))
+    db.commit()
+    
+    count = db.query(UserCategoryStats).count()
+    print(f"✅ Rebuilt {count} user-category rollup rows in {time.perf_counter() - start:.1f}s")
+    return count
\ No newline at end of file
@@ -0,0 +1,325 @@
+import os
+import json
+import glob
+import uuid
+import fcntl
+import asyncio
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.models.interaction import InteractionCreate
+from app.services.interaction_ingest import ingest, validation_message
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class QueueFullError(Exception):
+    """Raised when the write-behind queue stayed full for the whole enqueue timeout"""
+
+
+class WriteBehindQueue:
+    """
+    Acknowledge interactions at once and write them to the database in batches
+    
+    Events get a sequence number (write order within this process) and the time they were
+    queued, which is stored as their timestamp however late they are written. They sit in memory
+    until a background task flushes them through the bulk ingest path, once batch_size
+    are queued or every flush_seconds. With a log_dir, each event is first appended to
+    a log segment (fsync'd if fsync is set); segments are deleted once their events are
+    committed, and any left over after a crash are replayed at startup. Delivery is
+    at-least-once: a crash between the commit and the segment delete replays that batch.
+    
+    Workers sharing a log_dir each write to their own subdirectory and hold its owner
+    lock while alive; replay only takes over directories whose owner lock is free.
+    
+    When max_queue events are waiting, callers block up to enqueue_timeout and then get
+    QueueFullError, so producers slow down instead of growing memory without bound.
+    """
+    
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_seconds: float = 0.2,
+        max_queue: int = 10000,
+        enqueue_timeout: float = 1.0,
+        log_dir: str = "",
+        fsync: bool = True
+    ):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_queue = max_queue
+        self.enqueue_timeout = enqueue_timeout
+        self.log_dir = log_dir
+        self.fsync = fsync
+        self._log_path = os.path.join(log_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}") if log_dir else ""
+        self._owner_lock = None  # open + flock'd while this process owns _log_path
+        
+        self.sequence = 0
+        self.flushed_sequence = 0
+        self._buffer: List[Tuple[int, Dict]] = []
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        
+        self._log = None
+        self._segments: List[str] = []  # closed segments whose events are not committed yet
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        # metrics
+        self.batches = 0
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+    
+    def enqueue(self, interaction: InteractionCreate) -> int:
+        """Queue one validated interaction; returns its sequence number"""
+        record = {
+            **interaction.model_dump(),
+            "timestamp": datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+        }
+        
+        with self._space:
+            if not self._space.wait_for(lambda: len(self._buffer) < self.max_queue, self.enqueue_timeout):
+                self.rejected += 1
+                raise QueueFullError(f"{len(self._buffer)} interactions already queued")
+            
+            self.sequence += 1
+            sequence = self.sequence
+            if self.log_dir:
+                self._append(sequence, record)
+            self._buffer.append((sequence, record))
+            full = len(self._buffer) >= self.batch_size
+        
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return sequence
+    
+    def flush(self) -> int:
+        """Write everything queued so far in one transaction; returns the number of events written"""
+        with self._flush_lock:
+            with self._space:
+                items, self._buffer = self._buffer, []
+                if self.log_dir and items:
+                    self._rotate()
+                closed = list(self._segments)
+                self._space.notify_all()
+            
+            if not items:
+                return 0
+            
+            rows, timestamps, invalid = [], {}, []
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            for sequence, record in items:
+                # replayed entries come from disk: one bad record must not hold back the batch
+                try:
+                    record = dict(record)
+                    queued_at = record.pop("timestamp", None)  # missing in logs from older versions
+                    timestamps[sequence] = datetime.fromisoformat(queued_at) if queued_at else now
+                    rows.append((sequence, InteractionCreate(**record)))
+                except ValidationError as e:
+                    invalid.append({"index": sequence, "error": validation_message(e)})
+                except (TypeError, ValueError) as e:
+                    invalid.append({"index": sequence, "error": f"invalid record: {e}"})
+            
+            db = SessionLocal()
+            try:
+                inserted, errors = ingest(db, rows, batch_size=max(len(rows), 1), timestamps=timestamps)
+                errors = invalid + errors
+            except Exception:
+                # keep them (and their log segments) for the next attempt
+                db.rollback()
+                with self._space:
+                    self._buffer = items + self._buffer
+                raise
+            finally:
+                db.close()
+            
+            with self._lock:
+                for path in closed:
+                    os.remove(path)
+                    self._segments.remove(path)
+            
+            for error in errors:
+                print(f"⚠️  Dropped queued interaction #{error['index']}: {error['error']}")
+            
+            self.batches += 1
+            self.written += inserted
+            self.dropped += len(errors)
+            self.flushed_sequence = max(self.flushed_sequence, max(sequence for sequence, _ in items))
+            return inserted
+    
+    def replay(self) -> int:
+        """Write events left in log segments by dead processes (call before serving)"""
+        if not self.log_dir:
+            return 0
+        
+        with self._replay_lock():
+            self._claim()
+            paths = self._adopt_orphans()
+        
+        records = []
+        for path in paths:
+            with open(path) as log:
+                for line in log:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash mid-append
+                    records.append(entry['interaction'])
+        
+        with self._space:
+            # sequences are per process: number replayed events afresh so they cannot collide
+            items = []
+            for record in records:
+                self.sequence += 1
+                items.append((self.sequence, record))
+            self._segments = paths + self._segments
+            self._buffer = items + self._buffer
+        
+        written = self.flush()
+        if paths:
+            print(f"♻️  Replayed {written} queued interactions from {len(paths)} log segment(s)")
+        return written
+    
+    async def start(self) -> None:
+        """Start the background flush task on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Stop the flush task and write whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        await run_in_threadpool(self.flush)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "queued": len(self._buffer),
+                "max_queue": self.max_queue,
+                "last_sequence": self.sequence,
+                "flushed_sequence": self.flushed_sequence,
+                "batches": self.batches,
+                "written": self.written,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "log_segments": len(self._segments) + (self._log is not None)
+            }
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception as e:
+                print(f"⚠️  Write-behind flush failed, will retry: {e}")
+    
+    @contextmanager
+    def _replay_lock(self):
+        """Serializes replays and directory claims across the processes sharing log_dir"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(os.path.join(self.log_dir, "replay.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def _claim(self) -> None:
+        """Create this process's segment directory and hold its owner lock until exit (caller holds the replay lock)"""
+        if self._owner_lock is not None:
+            return
+        os.makedirs(self._log_path, exist_ok=True)
+        self._owner_lock = open(os.path.join(self._log_path, "owner.lock"), "a")
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+    
+    def _adopt_orphans(self) -> List[str]:
+        """
+        Move segments of dead processes (owner lock free) into this process's directory
+        Caller holds the replay lock; returns the adopted segment paths
+        """
+        adopted = []
+        
+        def adopt(path: str) -> None:
+            target = os.path.join(self._log_path, f"replayed-{len(adopted):06d}.log")
+            os.rename(path, target)
+            adopted.append(target)
+        
+        for path in sorted(glob.glob(os.path.join(self.log_dir, "*.log"))):  # written before per-process directories
+            adopt(path)
+        
+        for lock_path in sorted(glob.glob(os.path.join(self.log_dir, "*", "owner.lock"))):
+            directory = os.path.dirname(lock_path)
+            if directory == self._log_path:
+                continue
+            
+            with open(lock_path, "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live worker's queue
+                
+                for path in sorted(glob.glob(os.path.join(directory, "*.log"))):
+                    adopt(path)
+                try:
+                    os.remove(lock_path)
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+        
+        return adopted
+    
+    def _append(self, sequence: int, record: Dict) -> None:
+        """Append one event to the open log segment (caller holds the lock)"""
+        if self._log is None:
+            if self._owner_lock is None:
+                with self._replay_lock():
+                    self._claim()
+            self._log = open(os.path.join(self._log_path, f"{sequence:012d}.log"), "a")
+        
+        self._log.write(json.dumps({"seq": sequence, "interaction": record}) + "\n")
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+    
+    def _rotate(self) -> None:
+        """Close the open segment so events queued from now on go to a new one (caller holds the lock)"""
+        if self._log is not None:
+            self._segments.append(self._log.name)
+            self._log.close()
+            self._log = None
+
+
+@lru_cache()
+def get_write_behind_queue() -> WriteBehindQueue:
+    """Get the shared write-behind queue (used when INTERACTION_WRITE_MODE='write_behind')"""
+    return WriteBehindQueue(
+        batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+        flush_seconds=settings.WRITE_BEHIND_FLUSH_MS / 1000,
+        max_queue=settings.WRITE_BEHIND_MAX_QUEUE,
+        enqueue_timeout=settings.WRITE_BEHIND_ENQUEUE_TIMEOUT_MS / 1000,
+        log_dir=settings.WRITE_BEHIND_LOG_DIR,
+        fsync=settings.WRITE_BEHIND_FSYNC
+    )
\ No newline at end of file
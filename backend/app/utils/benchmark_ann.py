@@ -0,0 +1,92 @@
+import time
+import argparse
+import numpy as np
+from scipy import sparse
+
+from app.services.ann import LSHIndex
+from app.services.recommender import RecommenderEngine
+
+
+def synthetic_matrix(n_users: int, n_products: int, n_clusters: int, seed: int = 0) -> sparse.csr_matrix:
+    """Clustered implicit-feedback matrix: each user mostly touches one taste cluster"""
+    rng = np.random.default_rng(seed)
+    per_user = rng.integers(10, 40, size=n_users)
+    clusters = rng.integers(0, n_clusters, size=n_users)
+    cluster_size = max(1, n_products // n_clusters)
+    
+    rows = np.repeat(np.arange(n_users), per_user)
+    in_cluster = rng.random(rows.size) < 0.8
+    cols = np.where(
+        in_cluster,
+        np.repeat(clusters, per_user) * cluster_size + rng.integers(0, cluster_size, size=rows.size),
+        rng.integers(0, n_products, size=rows.size)
+    ) % n_products
+    weights = rng.choice([1.0, 2.0, 3.0, 4.0, 5.0], p=[0.5, 0.3, 0.1, 0.05, 0.05], size=rows.size)
+    
+    return sparse.csr_matrix((weights, (rows, cols)), shape=(n_users, n_products))
+
+
+def normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+
+def run(args):
+    print(f"\n🧪 ANN benchmark: {args.users} users x {args.products} products\n")
+    
+    matrix = synthetic_matrix(args.users, args.products, args.clusters)
+    normalized = normalize_rows(matrix)
+    
+    index = LSHIndex(num_tables=args.tables, num_bits=args.bits, probe_radius=args.radius)
+    start = time.perf_counter()
+    index.build(matrix)
+    print(f"⏱️  index build: {time.perf_counter() - start:.2f}s")
+    
+    rng = np.random.default_rng(1)
+    queries = rng.choice(args.users, size=args.queries, replace=False)
+    
+    exact_time, ann_time, recalls, candidate_counts = 0.0, 0.0, [], []
+    for row in queries:
+        start = time.perf_counter()
+        similarities = (normalized @ normalized[row].T).toarray().ravel()
+        similarities[row] = 0.0
+        exact = RecommenderEngine._top_k_indices(similarities, args.k)
+        exact_time += time.perf_counter() - start
+        
+        start = time.perf_counter()
+        candidates = index.candidates(row)
+        approx_similarities = np.zeros(matrix.shape[0])
+        if candidates.size:
+            approx_similarities[candidates] = (normalized[candidates] @ normalized[row].T).toarray().ravel()
+        approx = RecommenderEngine._top_k_indices(approx_similarities, args.k)
+        ann_time += time.perf_counter() - start
+        
+        candidate_counts.append(candidates.size)
+        if exact.size:
+            recalls.append(len(set(exact) & set(approx)) / exact.size)
+    
+    print(f"🎯 recall@{args.k}: {np.mean(recalls):.3f}")
+    print(f"📦 mean candidates: {np.mean(candidate_counts):.0f} ({np.mean(candidate_counts) / args.users:.2%} of users)")
+    print(f"⚡ exact: {exact_time / args.queries * 1000:.2f} ms/query")
+    print(f"⚡ ann:   {ann_time / args.queries * 1000:.2f} ms/query ({exact_time / max(ann_time, 1e-9):.1f}x)")
+    
+    # incremental insertion: re-hash 1% of users after new interactions
+    changed = rng.choice(args.users, size=max(1, args.users // 100), replace=False)
+    index.mark_dirty(changed)
+    start = time.perf_counter()
+    index.sync(matrix)
+    print(f"🔁 re-hash {changed.size} changed users: {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall/latency of LSH user similarity vs exact search")
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--tables", type=int, default=16)
+    parser.add_argument("--bits", type=int, default=12)
+    parser.add_argument("--radius", type=int, default=1)
+    run(parser.parse_args())
@@ -0,0 +1,100 @@
+import time
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import httpx
+
+
+def request_mix(args) -> list:
+    """(label, path, params) round-robin over the database-backed endpoints"""
+    return [
+        ("products", "/products", {"limit": 20}),
+        ("product", f"/products/{args.product}", {}),
+        ("similar", f"/products/{args.product}/similar", {"n": 10}),
+        ("interactions", f"/users/{args.user}/interactions", {}),
+        ("analytics", f"/analytics/user/{args.user}", {}),
+        ("recommendations", f"/recommendations/{args.user}", {"n": 10, "include_explanations": False}),
+    ]
+
+
+async def worker(client: httpx.AsyncClient, mix: list, offset: int, deadline: float, latencies: dict) -> None:
+    """Closed loop: send the next request as soon as the previous one returns"""
+    i = offset
+    while time.perf_counter() < deadline:
+        label, path, params = mix[i % len(mix)]
+        start = time.perf_counter()
+        response = await client.get(path, params=params)
+        response.raise_for_status()
+        latencies.setdefault(label, []).append((time.perf_counter() - start) * 1000)
+        i += 1
+
+
+async def measure(args, concurrency: int) -> dict:
+    """Latencies (ms) per endpoint from one client process"""
+    mix = request_mix(args)
+    
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        # one pass to warm caches and connections
+        for _, path, params in mix:
+            await client.get(path, params=params)
+        
+        latencies = {}
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            worker(client, mix, i, start + args.duration, latencies)
+            for i in range(concurrency)
+        ])
+    return latencies
+
+
+def measure_in_process(args, concurrency: int) -> dict:
+    return asyncio.run(measure(args, concurrency))
+
+
+def run(args):
+    args.processes = max(1, min(args.processes, args.concurrency))
+    print(
+        f"\n🧪 Concurrency benchmark: {args.concurrency} clients in {args.processes} process(es) "
+        f"for {args.duration:.0f}s ({args.url})\n"
+    )
+    
+    # a single asyncio client tops out at a few hundred req/s, so spread the load
+    per_process = [
+        args.concurrency // args.processes + (i < args.concurrency % args.processes)
+        for i in range(args.processes)
+    ]
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        results = list(pool.map(measure_in_process, [args] * args.processes, per_process))
+    
+    latencies = {}
+    for result in results:
+        for label, values in result.items():
+            latencies.setdefault(label, []).extend(values)
+    
+    for label, values in sorted(latencies.items()):
+        values = np.array(values)
+        print(
+            f"  {label:<16} {values.size:>6} requests, "
+            f"p50 {np.percentile(values, 50):7.1f} ms, p99 {np.percentile(values, 99):7.1f} ms"
+        )
+    
+    total = sum(len(values) for values in latencies.values())
+    everything = np.concatenate([np.array(values) for values in latencies.values()])
+    print(
+        f"\n📊 {total / args.duration:.1f} req/s overall, "
+        f"p50 {np.percentile(everything, 50):.1f} ms, p99 {np.percentile(everything, 99):.1f} ms\n"
+    )
+
+
+if __name__ == "__main__":
+    # run against a single uvicorn worker so only in-process concurrency is measured
+    parser = argparse.ArgumentParser(description="Requests/second of the database-backed endpoints under concurrency")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--user", type=int, default=1)
+    parser.add_argument("--product", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=4, help="client processes sharing the concurrency")
+    parser.add_argument("--duration", type=float, default=15.0)
+    run(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,76 @@
+import time
+
+from app.database import SessionLocal, init_db
+from app.services.interaction_matrix import get_interaction_matrix
+from app.services.item_knn import get_item_knn_model
+from app.services.content_model import get_content_model, get_content_similarity_index
+from app.services.als import get_als_model
+from app.services.behavioral_profile import rebuild_profiles
+from app.services.user_stats import rebuild_user_stats
+
+
+def build_item_knn():
+    """Build and persist the item-item neighbour table"""
+    print("🧮 Building item-item neighbour table...")
+    start = time.perf_counter()
+    
+    model = get_item_knn_model()
+    model.build(get_interaction_matrix())
+    model.save()
+    
+    print(f"✅ {len(model.table.ids)} products, top-{model.k} neighbours in {time.perf_counter() - start:.1f}s -> {model.path}")
+
+
+def build_content_similarity():
+    """Build and persist the product content-similarity index"""
+    print("🧮 Building content-similarity index...")
+    start = time.perf_counter()
+    
+    index = get_content_similarity_index()
+    index.build()
+    index.save()
+    
+    print(f"✅ {len(index.table.ids)} products, top-{index.k} neighbours in {time.perf_counter() - start:.1f}s -> {index.path}")
+
+
+def build_als():
+    """Train and persist implicit ALS factors"""
+    print("🧮 Training ALS factors...")
+    start = time.perf_counter()
+    
+    model = get_als_model()
+    model.fit(get_interaction_matrix())
+    model.save()
+    
+    print(f"✅ {len(model.user_ids)} users x {len(model.product_ids)} products, {model.factors} factors in {time.perf_counter() - start:.1f}s -> {model.path}")
+
+
+def build_all():
+    """Build all offline recommendation models"""
+    print("\n🚀 Building offline models...\n")
+    
+    init_db()
+    db = SessionLocal()
+    
+    try:
+        get_interaction_matrix().build(db)
+        build_item_knn()
+        build_als()
+        
+        get_content_model().build(db)
+        build_content_similarity()
+        
+        print("🧮 Rebuilding user behavioral profiles...")
+        rebuild_profiles(db)
+        
+        print("🧮 Rebuilding user category rollups...")
+        rebuild_user_stats(db)
+        
+        print("\n✨ Model build completed successfully!\n")
+    
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    build_all()
@@ -0,0 +1,79 @@
+import time
+import asyncio
+import argparse
+import numpy as np
+import httpx
+
+
+async def probe_products(client: httpx.AsyncClient, duration: float, interval: float) -> list:
+    """Hit the cheap /products endpoint repeatedly and record latencies (ms)"""
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/products", params={"limit": 10})
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def explain_forever(client: httpx.AsyncClient, args, stop: asyncio.Event, latencies: list) -> None:
+    """Keep one explanation request in flight until told to stop"""
+    if args.target == 'recommendations':
+        path, params = f"/recommendations/{args.user}", {"n": args.n, "include_explanations": True}
+    else:
+        path, params = f"/recommendations/{args.user}/explain/{args.product}", {}
+    
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(path, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def report(label: str, latencies: list) -> None:
+    values = np.array(latencies)
+    print(
+        f"{label}: {values.size} requests, "
+        f"p50 {np.percentile(values, 50):.1f} ms, "
+        f"p99 {np.percentile(values, 99):.1f} ms, "
+        f"max {values.max():.1f} ms"
+    )
+
+
+async def run(args):
+    print(f"\n🧪 /products latency with and without LLM explanations in flight ({args.url})\n")
+    
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        baseline = await probe_products(client, args.duration, args.interval)
+        report("📊 idle          ", baseline)
+        
+        stop = asyncio.Event()
+        explain_latencies = []
+        explainers = [
+            asyncio.create_task(explain_forever(client, args, stop, explain_latencies))
+            for _ in range(args.concurrency)
+        ]
+        await asyncio.sleep(0.5)  # let the explanation calls reach the LLM
+        
+        loaded = await probe_products(client, args.duration, args.interval)
+        stop.set()
+        await asyncio.gather(*explainers)
+        
+        report(f"⚡ {args.concurrency} explaining", loaded)
+        report(f"💬 {args.target:<15}", explain_latencies)
+        print()
+
+
+if __name__ == "__main__":
+    # offline: start the server with LLM_BACKEND=fake (and EXPLANATION_CACHE_TTL_SECONDS=0 to measure the LLM path)
+    parser = argparse.ArgumentParser(description="Check that LLM explanations do not stall unrelated endpoints")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--user", type=int, default=1)
+    parser.add_argument("--product", type=int, default=1)
+    parser.add_argument("--target", choices=["explain", "recommendations"], default="explain")
+    parser.add_argument("--n", type=int, default=10, help="recommendations per request (--target recommendations)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
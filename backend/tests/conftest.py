@@ -0,0 +1,68 @@
+import os
+import random
+import tempfile
+
+# settings are read once at import time, so point them at a scratch database and the offline LLM first
+_scratch = tempfile.mkdtemp(prefix="heart_mind_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch}/test.db"
+os.environ["MODEL_DIR"] = os.path.join(_scratch, "models")
+os.environ["DEBUG"] = "False"
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["LLM_FAKE_LATENCY_MS"] = "0"
+os.environ["LLM_FAKE_TOKENS_PER_SECOND"] = "1000000"
+
+import pytest
+
+from app.database import Base, engine, SessionLocal
+from app.models.product import Product
+from app.models.user import User
+from app.models.interaction import Interaction, INTERACTION_WEIGHTS
+
+CATEGORIES = ["Electronics", "Fashion", "Home", "Books", "Sports"]
+
+
+@pytest.fixture
+def db():
+    """Session on freshly created tables"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def catalog(db):
+    """40 products, 80 users and 3000 random interactions (fixed seed); returns the user ids"""
+    rng = random.Random(7)
+    
+    products = [
+        Product(
+            name=f"Product {i}",
+            category=CATEGORIES[i % len(CATEGORIES)],
+            price=round(rng.uniform(5, 500), 2),
+            rating=round(rng.uniform(3.5, 5.0), 1),
+            description=f"Description of product {i}",
+            tags=[f"tag{i % 7}", f"tag{i % 3}"],
+            stock=10
+        )
+        for i in range(40)
+    ]
+    users = [User(name=f"User {i}", email=f"user{i}@example.com") for i in range(80)]
+    db.add_all(products + users)
+    db.commit()
+    
+    for _ in range(3000):
+        interaction_type = rng.choice(list(INTERACTION_WEIGHTS))
+        db.add(Interaction(
+            user_id=rng.choice(users).id,
+            product_id=rng.choice(products).id,
+            interaction_type=interaction_type,
+            weight=INTERACTION_WEIGHTS[interaction_type]
+        ))
+    db.commit()
+    
+    return [user.id for user in users]
@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from app.models.interaction import Interaction, INTERACTION_WEIGHTS
+from app.services.interaction_matrix import get_interaction_matrix
+from app.services.recommender import RecommenderEngine
+
+
+def reference_collaborative_filtering(db, user_id):
+    """The dict-based user-user CF (with its per-pair _cosine_similarity) that the sparse version replaced"""
+    user_item_matrix = defaultdict(lambda: defaultdict(float))
+    for interaction in db.query(Interaction).all():
+        user_item_matrix[interaction.user_id][interaction.product_id] += INTERACTION_WEIGHTS.get(
+            interaction.interaction_type, 1.0
+        )
+    
+    if user_id not in user_item_matrix:
+        return {}
+    
+    def cosine_similarity(vec1, vec2):
+        common_keys = set(vec1.keys()) & set(vec2.keys())
+        if not common_keys:
+            return 0.0
+        
+        dot_product = sum(vec1[k] * vec2[k] for k in common_keys)
+        mag1 = np.sqrt(sum(v**2 for v in vec1.values()))
+        mag2 = np.sqrt(sum(v**2 for v in vec2.values()))
+        if mag1 == 0 or mag2 == 0:
+            return 0.0
+        return dot_product / (mag1 * mag2)
+    
+    target_vector = user_item_matrix[user_id]
+    similarities = {}
+    for other_user_id, other_vector in user_item_matrix.items():
+        if other_user_id == user_id:
+            continue
+        sim = cosine_similarity(target_vector, other_vector)
+        if sim > 0:
+            similarities[other_user_id] = sim
+    
+    recommendations = defaultdict(float)
+    for other_user_id, similarity in sorted(similarities.items(), key=lambda x: x[1], reverse=True)[:10]:
+        for product_id, weight in user_item_matrix[other_user_id].items():
+            if product_id not in target_vector:
+                recommendations[product_id] += weight * similarity
+    
+    return dict(recommendations)
+
+
+def test_matches_dict_implementation(db, catalog):
+    get_interaction_matrix().build(db)
+    engine = RecommenderEngine(db)
+    
+    for user_id in catalog:
+        expected = reference_collaborative_filtering(db, user_id)
+        actual = {rec['product_id']: rec['score'] for rec in engine._collaborative_filtering(user_id, [])}
+        
+        assert actual.keys() == expected.keys(), f"user {user_id}"
+        for product_id, score in expected.items():
+            assert actual[product_id] == pytest.approx(score, rel=1e-9), f"user {user_id}, product {product_id}"
+
+
+def test_user_without_interactions(db, catalog):
+    get_interaction_matrix().build(db)
+    
+    assert RecommenderEngine(db)._collaborative_filtering(10_000, []) == []
@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.database import engine
+from app.models.product import Product
+from app.services.behavioral_profile import rebuild_profiles
+from app.services.llm_explainer import LLMExplainer
+
+
+@contextmanager
+def count_queries():
+    """SQL statements sent while the block runs"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", LLMExplainer.EXPLANATION_MODES)
+async def test_batch_explain_query_count_does_not_grow_with_items(db, catalog, mode):
+    rebuild_profiles(db)
+    products = [product.to_dict() for product in db.query(Product).order_by(Product.id)]
+    explainer = LLMExplainer(db)
+    
+    counts = []
+    for size in (1, 5, 20):
+        recommendations = [
+            {'product': product, 'score': 1.0, 'source': 'collaborative'}
+            for product in products[:size]
+        ]
+        with count_queries() as statements:
+            explained = await explainer.batch_explain(catalog[0], recommendations, mode=mode)
+        
+        assert len(explained) == size
+        counts.append(len(statements))
+    
+    # the user context is built once per call and the explanation cache is read and
+    # written once (delete + insert), however many items are explained
+    assert counts == [counts[0]] * len(counts)
+    assert counts[0] <= 5, counts